@@ -0,0 +1,72 @@
+"""启动基准测试: 比较没有位图和启动快照时(完整重建)与使用快照时RecordManager的加载时间
+
+用法(在code目录下): python benchmarks/cold_start_bench.py [每个性别的学生数] [每个模式的记录数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.record_manager import RecordManager
+
+SURNAMES = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚"
+
+
+def make_roster(folder, students):
+    rng = random.Random(0)
+    os.makedirs(folder, exist_ok=True)
+    for g, gender in enumerate(("boy", "girl")):
+        with open(os.path.join(folder, f"{gender}s.txt"), "w", encoding="utf-8") as f:
+            for i in range(students):
+                name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(2))
+                f.write(f"{g * students + i + 1} {name}\n")
+
+
+def make_records(manager, records):
+    rng = random.Random(1)
+    for mode in manager.modes:
+        manager.add_record(mode, rng.sample(range(1, records * 2), records))
+
+
+def start(use_cache):
+    if not use_cache:
+        record_folder = os.path.join("ConfigEngine", "LotteryRecords")
+        for name in os.listdir(record_folder):
+            if name.endswith(".bits"):
+                os.remove(os.path.join(record_folder, name))
+        if os.path.exists(os.path.join("ConfigEngine", "startup.snap")):
+            os.remove(os.path.join("ConfigEngine", "startup.snap"))
+    begin = time.perf_counter()
+    manager = RecordManager()
+    elapsed = time.perf_counter() - begin
+    timing = manager.startup_timing
+    manager.close()
+    return elapsed, timing
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    records = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            make_roster(os.path.join("ConfigEngine", "StudentInfo"), students)
+            manager = RecordManager()
+            make_records(manager, records)
+            manager.close()
+            for label, use_cache in (("完整重建", False), ("使用快照", True)):
+                elapsed, timing = start(use_cache)
+                print(f"{label:<8}总计{elapsed * 1000:>9.1f} ms  "
+                      f"记录{timing['records'] * 1000:>8.1f} ms  "
+                      f"名单{timing['students'] * 1000:>8.1f} ms  "
+                      f"快照命中: {timing['snapshot']}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""抽号模拟基准测试: 按固定种子连续抽号, 输出耗时和结果校验和
+
+每次抽号的随机种子由基础种子派生(与界面中每次抽号独立取种子的方式相同),
+同一基础种子两次运行的抽号结果完全一致, 校验和可用于确认修改没有改变抽号结果。
+
+用法(在code目录下): python benchmarks/draw_bench.py [抽号次数] [最大号码] [基础种子] [random|fair]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import draw_replay
+from core.fair_sampler import STRATEGY_FAIR
+from core.rate_manager import RateManager
+from core.record_manager import RecordManager
+
+MODE = "模式一"
+
+
+def simulate(draws, max_num, base_seed, strategy):
+    seeds = random.Random(base_seed)
+    records = RecordManager()
+    rates = RateManager(records.storage)
+    rates.set_rate(MODE, 3, 4)
+    rates.set_rate(MODE, 7, 6)
+    rates.set_chain_rule(MODE, 5, 9)
+    checksum = 0
+    elapsed = 0.0
+    try:
+        for i in range(draws):
+            seed = seeds.getrandbits(63)
+            quantity = 1 + i % 5
+            # 模拟的时间也由抽号次数决定, 公平策略的权重与运行时刻无关
+            when = 1700000000.0 + i * 60
+            deck = records.get_deck(MODE, None, max_num)
+            sampler = None
+            if strategy == STRATEGY_FAIR:
+                sampler = records.get_fair_sampler(MODE, None, deck, when)
+            start = time.perf_counter()
+            numbers, _ = rates.draw_many(MODE, quantity, deck,
+                                         refill=lambda: records.get_deck(MODE, None, max_num),
+                                         rng=draw_replay.draw_rng(seed), sampler=sampler, now=when)
+            elapsed += time.perf_counter() - start
+            records.add_record(MODE, numbers, None, max_num, seed=seed, when=when)
+            checksum = zlib.crc32(" ".join(map(str, numbers)).encode(), checksum)
+    finally:
+        rates.close()
+        records.close()
+    return elapsed, checksum
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_num = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    base_seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    strategy = sys.argv[4] if len(sys.argv) > 4 else "random"
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            elapsed, checksum = simulate(draws, max_num, base_seed, strategy)
+        finally:
+            os.chdir(cwd)
+    print(f"{draws}次抽号({strategy}, 最大号码{max_num}, 种子{base_seed}):")
+    print(f"平均每次 {elapsed / draws * 1e6:.1f} us, 结果校验和 {checksum:08x}")
+
+
+if __name__ == "__main__":
+    main()
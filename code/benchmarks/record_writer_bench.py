@@ -0,0 +1,59 @@
+"""记录写入器基准测试: 比较各持久化策略下每秒可完成的抽号次数
+
+用法(在code目录下): python benchmarks/record_writer_bench.py [抽号次数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.cipher import SimpleCipher
+from core import record_format
+from core.record_manager import ENCRYPTION_KEY
+from core.record_writer import RecordWriter
+
+POLICIES = ["none", "flush", "fsync-every-100ms", "fsync-per-draw"]
+
+
+def bench_legacy(path, cipher, draws):
+    # 旧做法: 每次抽号都打开、追加、关闭文件
+    start = time.perf_counter()
+    for i in range(draws):
+        record_format.append_record_file(path, cipher, [i])
+    return time.perf_counter() - start
+
+
+def bench_policy(path, cipher, draws, policy, group_size=1):
+    writer = RecordWriter(path, cipher, policy)
+    start = time.perf_counter()
+    for i in range(0, draws, group_size):
+        with writer.group():
+            for j in range(i, min(i + group_size, draws)):
+                writer.append([j])
+    writer.close()
+    return time.perf_counter() - start
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cipher = SimpleCipher(ENCRYPTION_KEY)
+    with tempfile.TemporaryDirectory() as folder:
+        def fresh(name):
+            path = os.path.join(folder, name)
+            record_format.create_record_file(path)
+            return path
+
+        elapsed = bench_legacy(fresh("legacy.rec"), cipher, draws)
+        print(f"{'open/append/close':<28}{draws / elapsed:>12.0f} 次/秒")
+        for policy in POLICIES:
+            for group_size in (1, 5):
+                path = fresh(f"{policy}-{group_size}.rec")
+                elapsed = bench_policy(path, cipher, draws, policy, group_size)
+                assert list(record_format.read_record_file(path, cipher)) == list(range(draws))
+                label = f"{policy} (每组{group_size}次)"
+                print(f"{label:<28}{draws / elapsed:>12.0f} 次/秒")
+
+
+if __name__ == "__main__":
+    main()
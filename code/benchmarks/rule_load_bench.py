@@ -0,0 +1,97 @@
+"""规则加载基准测试: 比较旧版pickle规则文件与定长规则格式的加载时间
+
+用法(在code目录下): python benchmarks/rule_load_bench.py [规则数]
+"""
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import rule_format
+from core.storage import FileStorage
+
+MODES = ["模式一", "模式二", "模式三", "模式四", "模式五"]
+
+
+def make_rules(count):
+    rng = random.Random(0)
+    now = datetime.now()
+    rates = []
+    for i in range(count):
+        rates.append({"mode": MODES[i % len(MODES)], "number": i // len(MODES) + 1,
+                      "rate": rng.randint(1, 20), "count": rng.randint(0, 100),
+                      "last_draw": now if i % 2 else None})
+    return rates
+
+
+def timed(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rules = make_rules(count)
+    with tempfile.TemporaryDirectory() as folder:
+        # 旧版: 每条规则一个pickle文件, 加载时列目录并逐个反序列化
+        legacy_folder = os.path.join(folder, "legacy")
+        os.makedirs(legacy_folder)
+        for i, rule in enumerate(rules):
+            with open(os.path.join(legacy_folder, f"{i}.rate"), "wb") as f:
+                pickle.dump(rule, f)
+
+        def load_legacy():
+            loaded = []
+            for filename in os.listdir(legacy_folder):
+                with open(os.path.join(legacy_folder, filename), "rb") as f:
+                    loaded.append(pickle.load(f))
+            return loaded
+
+        # 按模式保存的pickle列表
+        pickled_folder = os.path.join(folder, "pickled")
+        os.makedirs(pickled_folder)
+        for mode in MODES:
+            with open(os.path.join(pickled_folder, f"{mode}.rates"), "wb") as f:
+                pickle.dump([r for r in rules if r["mode"] == mode], f)
+
+        def load_pickled():
+            loaded = []
+            for mode in MODES:
+                with open(os.path.join(pickled_folder, f"{mode}.rates"), "rb") as f:
+                    loaded.extend(pickle.load(f))
+            return loaded
+
+        # 定长规则格式, 通过FileStorage批量读取
+        storage = FileStorage(os.path.join(folder, "ConfigEngine"))
+        storage.save_rate_rules(rules)
+
+        size = sum(os.path.getsize(os.path.join(storage.rate_folder, f))
+                   for f in os.listdir(storage.rate_folder))
+        results = [
+            ("每条规则一个pickle文件", load_legacy, sum(
+                os.path.getsize(os.path.join(legacy_folder, f)) for f in os.listdir(legacy_folder))),
+            ("按模式的pickle文件", load_pickled, sum(
+                os.path.getsize(os.path.join(pickled_folder, f)) for f in os.listdir(pickled_folder))),
+            ("定长规则格式", storage.load_rate_rules, size),
+        ]
+        print(f"加载{count}条爆率规则:")
+        for label, func, nbytes in results:
+            elapsed, loaded = timed(func)
+            assert len(loaded) == count
+            print(f"{label:<16}{elapsed * 1000:>9.1f} ms {nbytes / 1024:>9.1f} KB")
+        data = rule_format.pack_rules(rule_format.KIND_RATE, rules)
+        elapsed, _ = timed(lambda: rule_format.unpack_rules(rule_format.KIND_RATE, data))
+        print(f"{'仅解码(内存中)':<16}{elapsed * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,53 @@ ENCRYPTION_KEY = base64.b64encode(os.urandom(32)).decode()
 class SimpleCipher:
     def __init__(self, encryption_key):
         self.encryption_key = encryption_key
+        if isinstance(encryption_key, str):
+            encryption_key = encryption_key.encode()
+        self.key_bytes = bytes(encryption_key)
+        self._keystream = self.key_bytes
+
+    def keystream(self, length, offset=0):
+        """返回从offset处开始、长度为length的重复密钥流(按需扩展并缓存)"""
+        start = offset % len(self.key_bytes)
+        if len(self._keystream) < start + length:
+            self._keystream = self.key_bytes * ((start + length) // len(self.key_bytes) + 1)
+        return self._keystream[start:start + length]
+
+    @staticmethod
+    def xor_bytes(data, keystream):
+        """整块异或: 转为大整数一次完成, 避免逐字节循环"""
+        if not data:
+            return b""
+        value = int.from_bytes(data, "big") ^ int.from_bytes(keystream, "big")
+        return value.to_bytes(len(data), "big")
+
+    def xor_at(self, data, offset=0):
+        """把data视为密文流中offset位置开始的一段进行异或"""
+        return self.xor_bytes(data, self.keystream(len(data), offset))
+
+    def _xor_lines(self, chunks):
+        # 每行都从密钥开头异或, 拼接对应长度的密钥流后整块处理一次
+        lengths = [len(c) for c in chunks]
+        mixed = self.xor_bytes(b"".join(chunks), b"".join(self.keystream(n) for n in lengths))
+        result = []
+        pos = 0
+        for n in lengths:
+            result.append(mixed[pos:pos + n])
+            pos += n
+        return result
 
     def encrypt(self, text):
-        text = text.encode()
-        xor_bytes = [text[i] ^ self.encryption_key[i % len(self.encryption_key)] for i in range(len(text))]
-        return base64.b64encode(bytes(xor_bytes)).decode()
+        return self.encrypt_many([text])[0]
 
     def decrypt(self, encrypted):
-        xor_bytes = base64.b64decode(encrypted.encode())
-        return bytes([xor_bytes[i] ^ self.encryption_key[i % len(self.encryption_key)] for i in range(len(xor_bytes))]).decode()
+        return self.decrypt_many([encrypted])[0]
+
+    def encrypt_many(self, texts):
+        """批量加密, 结果与逐条调用encrypt完全一致"""
+        chunks = self._xor_lines([str(t).encode() for t in texts])
+        return [base64.b64encode(c).decode() for c in chunks]
+
+    def decrypt_many(self, encrypted_lines):
+        """批量解密, 结果与逐条调用decrypt完全一致"""
+        chunks = self._xor_lines([base64.b64decode(e.encode()) for e in encrypted_lines])
+        return [c.decode() for c in chunks]
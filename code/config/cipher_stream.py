@@ -0,0 +1,98 @@
+import base64
+import codecs
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def iter_records(fileobj, cipher, chunk_size=DEFAULT_CHUNK_SIZE, skip_invalid=False):
+    """逐行读取按行加密的文件, 每凑满chunk_size条就产出一批解密结果
+
+    内存只与chunk_size有关, 调用方可以随时停止迭代。
+    skip_invalid为True时跳过无法解密的行, 否则抛出异常。
+    """
+    batch = []
+    for line in fileobj:
+        line = line.strip()
+        if not line:
+            continue
+        batch.append(line)
+        if len(batch) >= chunk_size:
+            yield _decrypt_batch(cipher, batch, skip_invalid)
+            batch = []
+    if batch:
+        yield _decrypt_batch(cipher, batch, skip_invalid)
+
+
+def _decrypt_batch(cipher, batch, skip_invalid):
+    try:
+        return cipher.decrypt_many(batch)
+    except Exception:
+        if not skip_invalid:
+            raise
+    # 整批失败时逐条重试, 只丢弃损坏的行
+    records = []
+    for line in batch:
+        try:
+            records.append(cipher.decrypt(line))
+        except Exception:
+            continue
+    return records
+
+
+def iter_blob_lines(fileobj, cipher, chunk_size=DEFAULT_CHUNK_SIZE):
+    """流式解密整文件只有一段密文的文件(如time_ranges.enc), 逐行产出明文"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""   # 未凑满4个字符的base64尾巴
+    tail = ""      # 未遇到换行的明文尾巴
+    offset = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        pending += "".join(chunk.split())
+        usable = len(pending) - len(pending) % 4
+        if not usable:
+            continue
+        raw = base64.b64decode(pending[:usable])
+        pending = pending[usable:]
+        text = tail + decoder.decode(cipher.xor_at(raw, offset))
+        offset += len(raw)
+        lines = text.split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        raise ValueError("密文长度不完整")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class CipherLineWriter:
+    """增量写入器: 缓冲明文记录, 每满chunk_size条批量加密后写出一次"""
+
+    def __init__(self, fileobj, cipher, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.cipher = cipher
+        self.chunk_size = chunk_size
+        self.buffer = []
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self.buffer:
+            self.fileobj.write("\n".join(self.cipher.encrypt_many(self.buffer)) + "\n")
+            self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
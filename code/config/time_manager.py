@@ -1,13 +1,10 @@
-import os
 from datetime import datetime, time
-from config.cipher import SimpleCipher
-from core.password_manager import ENCRYPTION_KEY
+from core.storage import FileStorage
 class TimeRestriction:
-    def __init__(self):
+    def __init__(self, storage=None):
         self.config_folder = "ConfigEngine"
-        self.time_folder = os.path.join(self.config_folder, "TimeRestrictions")
-        self.time_file = os.path.join(self.time_folder, "time_ranges.enc")
-        self.ensure_folders_exist()
+        self.storage = storage or FileStorage(self.config_folder)
+        self.stamp = None  # 最后一次读写后存储的状态
         
         self.default_ranges = [
             (1, 0, 7, 25), (8, 25, 8, 35),
@@ -18,37 +15,29 @@ class TimeRestriction:
         ]
         self.load_or_create_time_restriction()
 
-    def ensure_folders_exist(self):
-        os.makedirs(self.time_folder, exist_ok=True)
-
     def load_or_create_time_restriction(self):
-        if not os.path.exists(self.time_file):
+        try:
+            self.stamp = self.storage.change_stamp("time")
+            ranges = self.storage.load_time_ranges()
+        except:
+            ranges = None
+        if ranges is None:
             self.save_time_ranges(self.default_ranges)
         else:
-            try:
-                with open(self.time_file, "r") as f:
-                    encrypted = f.read()
-                    decrypted = SimpleCipher(ENCRYPTION_KEY).decrypt(encrypted)
-                    ranges = []
-                    for line in decrypted.splitlines():
-                        if line.strip():
-                            parts = line.strip().split()
-                            if len(parts) == 4:
-                                ranges.append(tuple(map(int, parts)))
-                    self.time_ranges = ranges
-            except:
-                self.save_time_ranges(self.default_ranges)
+            self.time_ranges = ranges
 
     def save_time_ranges(self, ranges):
-        lines = []
-        for r in ranges:
-            lines.append(f"{r[0]} {r[1]} {r[2]} {r[3]}")
-        content = "\n".join(lines)
-        encrypted = SimpleCipher(ENCRYPTION_KEY).encrypt(content)
-        with open(self.time_file, "w") as f:
-            f.write(encrypted)
+        self.storage.save_time_ranges(ranges)
+        self.stamp = self.storage.change_stamp("time")
         self.time_ranges = ranges
 
+    def reload_changed(self):
+        """时间段被其他程序修改时重新读取"""
+        if self.storage.change_stamp("time") == self.stamp:
+            return False
+        self.load_or_create_time_restriction()
+        return True
+
     def is_time_allowed(self):
         now = datetime.now().time()
         for r in self.time_ranges:
@@ -0,0 +1,156 @@
+import mmap
+import os
+import struct
+from collections.abc import Set
+
+# 已抽号码位图文件(.bits):
+#   48字节文件头: 魔数"LBIT" + 版本号 + 位图容量(位) + 已置位数量
+#                 + 已同步记录文件的指纹(大小, 修改时间, inode)
+#   之后是位图本身, 号码n对应第n位。整个文件以mmap映射, 启动时无需重建。
+MAGIC = b"LBIT"
+VERSION = 2
+HEADER = struct.Struct("<4sB3xQQqqQ")
+HEADER_SIZE = HEADER.size
+MIN_CAPACITY = 1024
+UNSYNCED = (-1, 0, 0)
+
+
+def popcount(data):
+    """统计一段字节中置位的数量"""
+    if not data:
+        return 0
+    return bin(int.from_bytes(data, "little")).count("1")
+
+
+class UsedNumberIndex(Set):
+    """以内存映射位图保存某个模式已抽过的号码, 提供集合接口
+
+    synced记录位图对应的记录文件指纹(大小, 修改时间, inode),
+    与当前文件不一致说明有新记录追加或文件被替换。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.capacity = 0
+        self.count = 0
+        self.synced = UNSYNCED
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER_SIZE:
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, MIN_CAPACITY, 0, *UNSYNCED))
+                f.write(bytes(MIN_CAPACITY // 8))
+        self.file = open(self.path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, capacity, count, *synced = HEADER.unpack_from(self.map, 0)
+        valid = (magic == MAGIC and version == VERSION and
+                 len(self.map) == HEADER_SIZE + capacity // 8 and
+                 popcount(self.map[HEADER_SIZE:]) == count)
+        if valid:
+            self.capacity = capacity
+            self.count = count
+            self.synced = tuple(synced)
+        else:
+            # 文件损坏(如写入中途断电)时重置为空位图, 由调用方按记录重建
+            self._remap(MIN_CAPACITY, reset=True)
+
+    def _remap(self, capacity, reset=False):
+        # Windows下映射中的文件不能改变大小, 需先解除映射
+        self.map.close()
+        if reset:
+            self.file.truncate(HEADER_SIZE)
+        self.file.truncate(HEADER_SIZE + capacity // 8)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = capacity
+        if reset:
+            self.map[:] = bytes(len(self.map))
+            self.count = 0
+            self.synced = UNSYNCED
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.capacity,
+                         self.count, *self.synced)
+
+    def _grow(self, number):
+        capacity = self.capacity
+        while number >= capacity:
+            capacity *= 2
+        self._remap(capacity)
+
+    def __contains__(self, number):
+        if not isinstance(number, int) or number < 0 or number >= self.capacity:
+            return False
+        return bool(self.map[HEADER_SIZE + (number >> 3)] & (1 << (number & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        data = self.map[HEADER_SIZE:]
+        for pos, byte in enumerate(data):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (pos << 3) | bit
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def add(self, number):
+        self._set(number)
+        self._write_header()
+
+    def _set(self, number):
+        if number >= self.capacity:
+            self._grow(number)
+        pos = HEADER_SIZE + (number >> 3)
+        mask = 1 << (number & 7)
+        byte = self.map[pos]
+        if not byte & mask:
+            self.map[pos] = byte | mask
+            self.count += 1
+
+    def update(self, numbers):
+        for number in numbers:
+            self._set(number)
+        self._write_header()
+
+    def clear(self):
+        self._remap(MIN_CAPACITY, reset=True)
+
+    def count_upto(self, max_num):
+        """统计1..max_num范围内已抽过的号码数量"""
+        max_num = min(max_num, self.capacity - 1)
+        if max_num < 1:
+            return 0
+        end = HEADER_SIZE + (max_num >> 3)
+        total = popcount(self.map[HEADER_SIZE:end])
+        last = self.map[end] & ((1 << ((max_num & 7) + 1)) - 1)
+        return total + popcount(bytes([last])) - (1 if 0 in self else 0)
+
+    def remaining(self, max_num):
+        """1..max_num范围内尚未抽到的号码数量"""
+        return max(0, max_num - self.count_upto(max_num))
+
+    def mark_synced(self, fingerprint):
+        self.synced = tuple(fingerprint)
+        self._write_header()
+
+    def flush(self):
+        if self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self._write_header()
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,77 @@
+import os
+import traceback
+from core.log import logger
+
+log = logger.get("watcher")
+
+_FAILED = object()  # 取状态失败, 本次不重载
+
+
+def file_stamp(path):
+    """文件的(大小, 修改时间, inode), 文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def folder_stamp(folder, suffix):
+    """目录中以suffix结尾的各文件的(文件名, 大小, 修改时间, inode), 按文件名排序"""
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return ()
+    stamps = []
+    for entry in entries:
+        if entry.name.endswith(suffix):
+            st = entry.stat()
+            stamps.append((entry.name, st.st_size, st.st_mtime_ns, st.st_ino))
+    return tuple(sorted(stamps))
+
+
+class ChangeWatcher:
+    """检测ConfigEngine中各数据源的变化, 只重载发生变化的缓存
+
+    每个数据源登记一个取状态的函数和重载函数; check()只比较状态(不读取内容),
+    状态与上次不同时才调用对应的重载函数。由界面的after()定时调用, 抽号本身不访问文件系统。
+    """
+
+    def __init__(self):
+        self.sources = {}  # 名称 -> [取状态函数, 上次的状态, 重载函数]
+
+    def watch(self, name, stamp, reload):
+        self.sources[name] = [stamp, self._stamp(name, stamp), reload]
+
+    def _stamp(self, name, stamp):
+        try:
+            return stamp()
+        except Exception as e:
+            log.error({
+                "error": "检查数据变化失败",
+                "source": name,
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+            return _FAILED
+
+    def check(self):
+        """返回本次确实重新加载了的数据源名称(重载函数返回真值)"""
+        changed = []
+        for name, source in self.sources.items():
+            stamp, last, reload = source
+            current = self._stamp(name, stamp)
+            if current is _FAILED or current == last:
+                continue
+            source[1] = current
+            try:
+                if reload():
+                    changed.append(name)
+            except Exception as e:
+                log.error({
+                    "error": "重新加载数据失败",
+                    "source": name,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return changed
@@ -0,0 +1,305 @@
+import os
+import random
+import struct
+import sys
+import zlib
+from array import array
+from contextlib import contextmanager
+
+# 号码池文件(.deck):
+#   32字节文件头: 魔数"LDK" + 版本号 + 最大号码 + 剩余数量 + 名单指纹 + 底表长度 + 交换记录数 + 底表类型
+#   之后是底表(名单号码; 连续号码1..N时省略)和按顺序追加的(位置, 号码)交换记录。
+# 采用惰性Fisher-Yates洗牌: 只记录被交换过的位置, 每次抽号O(1)且只追加一条记录,
+# 即使最大号码为百万级也无需生成完整列表。
+MAGIC = b"LDK"
+VERSION = 2
+HEADER = struct.Struct("<3sBIIQIIB3x")
+HEADER_SIZE = HEADER.size
+PAIR = struct.Struct("<II")
+BASE_RANGE = 0
+BASE_LIST = 1
+
+
+def roster_key(candidates):
+    """名单指纹: 名单或最大号码变化时号码池需要重建; 连续号码范围的指纹为0"""
+    if isinstance(candidates, range):
+        return 0
+    packed = array("I", sorted(candidates))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return zlib.crc32(packed.tobytes())
+
+
+def _pack(numbers):
+    packed = array("I", numbers)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(data):
+    numbers = array("I")
+    numbers.frombytes(data)
+    if sys.byteorder == "big":
+        numbers.byteswap()
+    return numbers
+
+
+class DrawDeck:
+    """一轮抽号的号码池, 随机取号和移除都是O(1), 保证一轮内不重不漏
+
+    逻辑上是一个数组: 位置i默认放底表的第i个号码, 被交换过的位置记在slots中。
+    前size个位置是尚未抽出的号码。
+    """
+
+    def __init__(self, path, max_num, key, base, size, slots=None):
+        self.path = path
+        self.max_num = max_num
+        self.key = key
+        self.base = base
+        self.size = size
+        self.slots = slots or {}   # 位置 -> 号码(仅记录被交换过的位置)
+        self.where = {number: slot for slot, number in self.slots.items()}
+        self.base_positions = None
+        self.journal_len = len(self.slots)
+        self.pending = []
+        self.batch_depth = 0
+
+    @classmethod
+    def create(cls, path, max_num, key, candidates, exclude=()):
+        """以candidates为底表建立新号码池, 并移除exclude中的号码"""
+        base = candidates if isinstance(candidates, range) else array("I", candidates)
+        deck = cls(path, max_num, key, base, len(base))
+        for number in exclude:
+            deck._take_number(number)
+        if not deck.size:
+            deck = cls(path, max_num, key, base, len(base))
+        deck.save()
+        return deck
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return cls.from_bytes(data, path)
+
+    @classmethod
+    def from_bytes(cls, data, path=None):
+        """从文件内容恢复号码池; path为None时只在内存中使用(如重放抽号)"""
+        try:
+            magic, version, max_num, size, key, base_len, pairs, base_type = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION or size > base_len:
+                return None
+            pos = HEADER_SIZE
+            if base_type == BASE_RANGE:
+                base = range(1, base_len + 1)
+            else:
+                base = _unpack(data[pos:pos + base_len * 4])
+                pos += base_len * 4
+            flat = _unpack(data[pos:pos + pairs * PAIR.size])
+            if len(base) != base_len or len(flat) != pairs * 2:
+                return None
+            # 按顺序重放交换记录, 已抽出区域(size之后)的位置不再需要
+            slots = {}
+            for slot, number in zip(flat[0::2], flat[1::2]):
+                slots[slot] = number
+            slots = {slot: number for slot, number in slots.items() if slot < size}
+            deck = cls(path, max_num, key, base, size, slots)
+            deck.journal_len = pairs
+            return deck
+        except (struct.error, ValueError):
+            return None
+
+    def _header(self):
+        base_type = BASE_RANGE if isinstance(self.base, range) else BASE_LIST
+        return HEADER.pack(MAGIC, VERSION, self.max_num, self.size, self.key,
+                           len(self.base), self.journal_len, base_type)
+
+    def _base_bytes(self):
+        return b"" if isinstance(self.base, range) else _pack(self.base)
+
+    @staticmethod
+    def _pair_bytes(pairs):
+        flat = array("I")
+        for slot, number in pairs:
+            flat.append(slot)
+            flat.append(number)
+        return _pack(flat)
+
+    def to_bytes(self):
+        """当前状态的完整文件内容(交换记录已合并)"""
+        journal_len = self.journal_len
+        self.journal_len = len(self.slots)
+        try:
+            return self._header() + self._base_bytes() + self._pair_bytes(self.slots.items())
+        finally:
+            self.journal_len = journal_len
+
+    def save(self):
+        self.journal_len = len(self.slots)
+        self.pending = []
+        if self.path is None:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._header())
+            f.write(self._base_bytes())
+            f.write(self._pair_bytes(self.slots.items()))
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def batch(self):
+        """范围内的多次取号和移除合并为一次文件写入"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                self._persist()
+
+    def _persist(self):
+        # 底表建立后不再变化: 改写文件头并在末尾追加新的交换记录
+        if self.batch_depth:
+            return
+        if self.path is None:
+            self.journal_len += len(self.pending)
+            self.pending = []
+            return
+        self.journal_len += len(self.pending)
+        with open(self.path, "r+b") as f:
+            f.write(self._header())
+            if self.pending:
+                f.seek(0, os.SEEK_END)
+                f.write(self._pair_bytes(self.pending))
+        self.pending = []
+
+    def _get(self, slot):
+        number = self.slots.get(slot)
+        return self.base[slot] if number is None else number
+
+    def _base_index(self, number):
+        if isinstance(self.base, range):
+            return number - 1 if 1 <= number <= len(self.base) else None
+        if self.base_positions is None:
+            self.base_positions = {n: i for i, n in enumerate(self.base)}
+        return self.base_positions.get(number)
+
+    def _slot_of(self, number):
+        if number in self.where:
+            return self.where[number]
+        slot = self._base_index(number)
+        if slot is None or slot >= self.size or slot in self.slots:
+            return None
+        return slot
+
+    def _take(self, slot):
+        last = self.size - 1
+        number = self._get(slot)
+        if slot != last:
+            moved = self._get(last)
+            self.slots[slot] = moved
+            self.where[moved] = slot
+            self.pending.append((slot, moved))
+        self.slots.pop(last, None)
+        self.where.pop(number, None)
+        self.size = last
+        return number
+
+    def _take_number(self, number):
+        slot = self._slot_of(number)
+        if slot is None:
+            return False
+        self._take(slot)
+        return True
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, number):
+        return self._slot_of(number) is not None
+
+    def __iter__(self):
+        for slot in range(self.size):
+            yield self._get(slot)
+
+    def remaining(self):
+        return list(self)
+
+    def pop(self, skip=(), rng=random):
+        """随机取出一个不在skip中的号码, 没有可取的号码时返回None"""
+        blocked = sum(1 for number in skip if number in self) if skip else 0
+        if self.size - blocked <= 0:
+            return None
+        while True:
+            slot = rng.randrange(self.size)
+            if self._get(slot) not in skip:
+                break
+        number = self._take(slot)
+        self._persist()
+        return number
+
+    def remove(self, number):
+        """号码被规则选中或在其他号码池中抽出时, 从本轮中移除"""
+        if not self._take_number(number):
+            return False
+        self._persist()
+        return True
+
+    def remove_many(self, numbers):
+        removed = sum(1 for number in numbers if self._take_number(number))
+        if removed:
+            self._persist()
+        return removed
+
+
+class DeckStore:
+    """按(模式, 性别)保存号码池, 最大号码或名单变化时自动重建"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.decks = {}
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get_path(self, mode, gender):
+        return os.path.join(self.folder, f"{mode}_{gender or 'all'}.deck")
+
+    def get_deck(self, mode, gender, max_num, candidates, exclude=()):
+        """返回可用的号码池; 抽完一轮后自动开始新一轮
+
+        candidates为本轮全部候选号码(连续号码传range), exclude为建新池时需要跳过的已抽号码。
+        """
+        key = roster_key(candidates)
+        deck = self.decks.get((mode, gender))
+        if deck is None:
+            deck = DrawDeck.load(self.get_path(mode, gender))
+        if deck is not None and (deck.max_num != max_num or deck.key != key):
+            deck = None
+        if deck is None:
+            deck = DrawDeck.create(self.get_path(mode, gender), max_num, key, candidates, exclude)
+        elif not len(deck):
+            deck = DrawDeck.create(self.get_path(mode, gender), max_num, key, candidates)
+        self.decks[(mode, gender)] = deck
+        return deck
+
+    def discard(self, mode, numbers, genders=(None, "boy", "girl")):
+        """从该模式的所有号码池中移除已抽出的号码"""
+        for gender in genders:
+            deck = self.decks.get((mode, gender))
+            if deck is None:
+                deck = DrawDeck.load(self.get_path(mode, gender))
+                if deck is None:
+                    continue
+                self.decks[(mode, gender)] = deck
+            deck.remove_many(numbers)
+
+    def reset(self, mode=None):
+        for (m, gender) in list(self.decks):
+            if mode is None or m == mode:
+                del self.decks[(m, gender)]
+        for filename in os.listdir(self.folder):
+            if filename.endswith(".deck") and (mode is None or filename.startswith(f"{mode}_")):
+                os.remove(os.path.join(self.folder, filename))
@@ -0,0 +1,112 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+def to_timestamp(value):
+    """datetime或时间戳统一为时间戳, None保持不变"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+def make_event(mode, numbers, gender=None, max_num=None, when=None, seed=None):
+    """抽号事件: 时间(时间戳)、模式、抽出的号码、性别筛选、最大号码和随机种子(见draw_replay)"""
+    return {
+        "time": to_timestamp(when) if when is not None else time.time(),
+        "mode": mode,
+        "numbers": [int(n) for n in numbers],
+        "gender": gender,
+        "max_num": max_num,
+        "seed": seed,
+    }
+
+
+class DrawHistory:
+    """内存中的抽号事件历史, 带时间索引和按(模式, 号码)的索引
+
+    事件按时间顺序保存, 时间范围查询用二分查找;
+    每个(模式, 号码)保存其被抽中时间的有序数组, 计数和最近抽中时间都是O(log n)。
+    """
+
+    def __init__(self, events=()):
+        self._rebuild(events)
+
+    def _rebuild(self, events):
+        """清空索引后按时间顺序重新索引events"""
+        self.events = []
+        self.times = array("d")
+        self.mode_ids = {}      # 模式 -> 事件编号数组
+        self.mode_times = {}    # 模式 -> 事件时间数组
+        self.number_times = {}  # (模式, 号码) -> 抽中时间数组
+        for event in sorted(events, key=lambda e: e["time"]):
+            self._index(event)
+
+    def _index(self, event):
+        event_id = len(self.events)
+        t = event["time"]
+        mode = event["mode"]
+        self.events.append(event)
+        self.times.append(t)
+        self.mode_ids.setdefault(mode, array("I")).append(event_id)
+        self.mode_times.setdefault(mode, array("d")).append(t)
+        for number in event["numbers"]:
+            self.number_times.setdefault((mode, number), array("d")).append(t)
+
+    def add(self, event):
+        if self.times and event["time"] < self.times[-1]:
+            # 系统时间被调回时按时间重新建立索引
+            events = self.events
+            events.append(event)
+            self._rebuild(events)
+        else:
+            self._index(event)
+
+    def __len__(self):
+        return len(self.events)
+
+    @staticmethod
+    def _span(times, start, end):
+        lo = 0 if start is None else bisect_left(times, to_timestamp(start))
+        hi = len(times) if end is None else bisect_right(times, to_timestamp(end))
+        return lo, hi
+
+    def query(self, start=None, end=None, mode=None, number=None):
+        """返回start到end(含)之间的事件, 可按模式和号码筛选, 按时间顺序排列"""
+        if mode is None:
+            lo, hi = self._span(self.times, start, end)
+            events = self.events[lo:hi]
+        else:
+            ids = self.mode_ids.get(mode, ())
+            lo, hi = self._span(self.mode_times.get(mode, ()), start, end)
+            events = [self.events[i] for i in ids[lo:hi]]
+        if number is not None:
+            events = [e for e in events if number in e["numbers"]]
+        return events
+
+    def count(self, mode, number, start=None, end=None):
+        """该模式下号码在时间范围内被抽中的次数; mode为None时统计所有模式"""
+        modes = self.mode_times if mode is None else [mode]
+        total = 0
+        for m in modes:
+            times = self.number_times.get((m, number))
+            if times:
+                lo, hi = self._span(times, start, end)
+                total += hi - lo
+        return total
+
+    def last_drawn(self, mode, number):
+        """号码最近一次被抽中的时间(datetime), 从未抽中时返回None"""
+        modes = self.mode_times if mode is None else [mode]
+        latest = None
+        for m in modes:
+            times = self.number_times.get((m, number))
+            if times and (latest is None or times[-1] > latest):
+                latest = times[-1]
+        return datetime.fromtimestamp(latest) if latest is not None else None
+
+    def last_drawn_times(self, mode):
+        """该模式下每个号码最近一次被抽中的时间戳"""
+        return {number: times[-1] for (m, number), times in self.number_times.items()
+                if m == mode and times}
@@ -0,0 +1,242 @@
+"""抽号重放: 每次抽号使用独立的随机数生成器, 种子和抽号前的状态快照一起保存,
+出现争议时可以用同一种子和快照重新运行抽号流程, 得到完全相同的结果。
+
+用法(在code目录下):
+    python -m core.draw_replay            列出最近的抽号
+    python -m core.draw_replay <抽号编号>  重放该次抽号并与记录的结果比较
+"""
+import base64
+import json
+import os
+import random
+import secrets
+import struct
+import sys
+import zlib
+from collections import deque
+from config.cipher import SimpleCipher
+from core import record_format
+from core.draw_deck import DrawDeck
+from core.fair_sampler import FairSampler
+from core.rate_manager import RateManager
+from core.storage import RuleStorage
+
+# 快照文件(.replay): 8字节文件头(魔数"LRPL" + 版本号 + 3字节保留) + 加密的zlib压缩JSON
+MAGIC = b"LRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sB3x")
+REPLAY_FOLDER = os.path.join("ConfigEngine", "LotteryRecords", "Replays")
+REPLAY_KEEP = 1000  # 最多保留的快照数, 超出时删除最早的
+
+
+def new_seed():
+    """每次抽号的随机种子(63位, 可直接存入SQLite整数列)"""
+    return secrets.randbits(63)
+
+
+def draw_rng(seed):
+    return random.Random(seed)
+
+
+def draw_id(seed, when):
+    return f"{int(when * 1000)}-{seed:016x}"
+
+
+def _id_time(draw_id):
+    return int(draw_id.split("-")[0])
+
+
+def _blob(data):
+    return base64.b64encode(zlib.compress(data)).decode("ascii")
+
+
+def _unblob(text):
+    return zlib.decompress(base64.b64decode(text))
+
+
+def capture(rate_manager, mode, gender, max_num, quantity, deck, gender_numbers, sampler,
+            strategy, seed, when):
+    """抽号前的状态快照: 号码池、该模式的规则和计数、待触发目标、性别名单及公平抽样器"""
+    rules = rate_manager.mode_rate_rules(mode, None)
+    snapshot = {
+        "id": draw_id(seed, when),
+        "seed": seed,
+        "time": when,
+        "mode": mode,
+        "gender": gender,
+        "max_num": max_num,
+        "quantity": quantity,
+        "strategy": strategy,
+        "pending_target": rate_manager.pending_target,
+        "rate_rules": [[r["number"], r["rate"], r["count"]] for r in rules],
+        "chain_rules": sorted([trigger, r["target"]]
+                              for trigger, r in rate_manager.chain_rules.get(mode, {}).items()),
+        "gender_numbers": sorted(gender_numbers) if gender_numbers is not None else None,
+        "deck": _blob(deck.to_bytes()),
+        "sampler": None,
+        "numbers": None,
+    }
+    if sampler is not None:
+        state = sampler.state()
+        snapshot["sampler"] = {
+            "key": list(sampler.key) if sampler.key is not None else None,
+            "current": sampler.pool is deck,
+            "state": {k: _blob(v) if isinstance(v, bytes) else v for k, v in state.items()},
+        }
+    return snapshot
+
+
+class ReplayStorage(RuleStorage):
+    """只在内存中保存快照里的规则, 重放时不写任何文件"""
+
+    def __init__(self, snapshot):
+        mode = snapshot["mode"]
+        self.rate_rules = [{"mode": mode, "number": n, "rate": rate, "count": count, "last_draw": None}
+                           for n, rate, count in snapshot["rate_rules"]]
+        self.chain_rules = [{"mode": mode, "trigger": trigger, "target": target, "last_draw": None}
+                            for trigger, target in snapshot["chain_rules"]]
+
+    def load_rate_rules(self, mode=None):
+        return [dict(r) for r in self.rate_rules if mode is None or r["mode"] == mode]
+
+    def get_rate_rule(self, mode, number):
+        for r in self.rate_rules:
+            if r["mode"] == mode and r["number"] == number:
+                return dict(r)
+        return None
+
+    def save_rate_rules(self, rules):
+        pass
+
+    def clear_rate_rules(self, mode=None):
+        self.rate_rules = [r for r in self.rate_rules if mode is not None and r["mode"] != mode]
+
+    def load_chain_rules(self, mode=None):
+        return [dict(r) for r in self.chain_rules if mode is None or r["mode"] == mode]
+
+    def get_chain_rule(self, mode, trigger):
+        for r in self.chain_rules:
+            if r["mode"] == mode and r["trigger"] == trigger:
+                return dict(r)
+        return None
+
+    def save_chain_rules(self, rules):
+        pass
+
+    def clear_chain_rules(self, mode=None):
+        self.chain_rules = [r for r in self.chain_rules if mode is not None and r["mode"] != mode]
+
+
+def replay(snapshot):
+    """用快照中的种子和状态重新运行抽号流程, 返回(号码列表, 说明)"""
+    deck = DrawDeck.from_bytes(_unblob(snapshot["deck"]))
+    if deck is None:
+        raise ValueError("快照中的号码池无法读取")
+    sampler = None
+    if snapshot["sampler"] is not None:
+        saved = snapshot["sampler"]
+        state = {k: _unblob(v) if isinstance(v, str) else v for k, v in saved["state"].items()}
+        key = tuple(saved["key"]) if saved["key"] is not None else None
+        sampler = FairSampler.restore(deck.base, state, key)
+        if saved["current"]:
+            sampler.pool = deck
+    gender_numbers = set(snapshot["gender_numbers"]) if snapshot["gender_numbers"] is not None else None
+    manager = RateManager(ReplayStorage(snapshot))
+    manager.pending_target = snapshot["pending_target"]
+    try:
+        return manager.draw_many(
+            snapshot["mode"],
+            snapshot["quantity"],
+            deck,
+            gender_numbers,
+            refill=lambda: DrawDeck.create(None, deck.max_num, deck.key, deck.base),
+            rng=draw_rng(snapshot["seed"]),
+            sampler=sampler,
+            now=snapshot["time"]
+        )
+    finally:
+        manager.close()
+
+
+class ReplayLog:
+    """按抽号编号保存快照, 每次抽号一个文件
+
+    已有的编号只在创建时读取一次目录, 之后在内存中维护, 保存时不再列目录。
+    """
+
+    def __init__(self, folder=REPLAY_FOLDER, keep=REPLAY_KEEP):
+        self.folder = folder
+        self.keep = keep
+        self.cipher = SimpleCipher(record_format.RECORD_KEY)
+        os.makedirs(self.folder, exist_ok=True)
+        self.ids = deque(self.scan_ids())
+        self.prune()
+
+    def get_path(self, draw_id):
+        return os.path.join(self.folder, f"{draw_id}.replay")
+
+    def save(self, snapshot):
+        data = zlib.compress(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+        path = self.get_path(snapshot["id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION))
+            f.write(self.cipher.xor_at(data))
+        os.replace(tmp_path, path)
+        if not self.ids or _id_time(self.ids[-1]) <= _id_time(snapshot["id"]):
+            self.ids.append(snapshot["id"])
+        else:
+            # 系统时间被调回时按时间重新排序
+            self.ids = deque(sorted(set(self.ids) | {snapshot["id"]}, key=_id_time))
+        self.prune()
+        return path
+
+    def load(self, draw_id):
+        with open(self.get_path(draw_id), "rb") as f:
+            data = f.read()
+        magic, version = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("不支持的快照格式")
+        return json.loads(zlib.decompress(self.cipher.xor_at(data[HEADER.size:])).decode("utf-8"))
+
+    def scan_ids(self):
+        """读取目录中的全部快照编号, 按时间顺序排列"""
+        ids = [name[:-len(".replay")] for name in os.listdir(self.folder) if name.endswith(".replay")]
+        return sorted(ids, key=_id_time)
+
+    def list_ids(self):
+        """按时间顺序排列的抽号编号"""
+        return list(self.ids)
+
+    def prune(self):
+        """超出keep时删除最早的快照"""
+        while len(self.ids) > self.keep:
+            old = self.ids.popleft()
+            try:
+                os.remove(self.get_path(old))
+            except FileNotFoundError:
+                pass
+
+
+def main(argv):
+    from datetime import datetime
+    log = ReplayLog()
+    if not argv:
+        for replay_id in log.list_ids()[-20:]:
+            snapshot = log.load(replay_id)
+            when = datetime.fromtimestamp(snapshot["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{replay_id}  {when}  {snapshot['mode']}  {snapshot['numbers']}")
+        return 0
+    snapshot = log.load(argv[0])
+    numbers, explanation = replay(snapshot)
+    print(f"记录的结果: {snapshot['numbers']}")
+    print(f"重放的结果: {numbers}")
+    for step in explanation["picks"]:
+        print(f"  {step['number']}: {step['source']}")
+    same = numbers == snapshot["numbers"]
+    print("结果一致" if same else "结果不一致")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+import random
+import time
+from array import array
+
+# 抽号策略: random为号码池中均匀随机, fair为按距上次被抽中的时间加权
+STRATEGY_RANDOM = "random"
+STRATEGY_FAIR = "fair"
+NEVER_DRAWN_AGE = 30 * 86400  # 从未被抽中的号码按30天前抽中计算
+MIN_WEIGHT = 3600.0           # 刚被抽中的号码也保留相当于1小时的权重
+
+
+class FenwickTree:
+    """树状数组: 单点修改和前缀和都是O(log n), 下标从1开始"""
+
+    def __init__(self, values, typecode="d"):
+        self.size = len(values)
+        self.tree = array(typecode, [0]) * (self.size + 1)
+        tree = self.tree
+        for i, value in enumerate(values, 1):
+            tree[i] += value
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+
+    @classmethod
+    def from_tree(cls, tree):
+        """由已有的树数组恢复(如重放抽号时的快照)"""
+        fenwick = cls.__new__(cls)
+        fenwick.size = len(tree) - 1
+        fenwick.tree = tree
+        return fenwick
+
+    def add(self, i, delta):
+        tree = self.tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        total = 0
+        tree = self.tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+class FairSampler:
+    """按距上次被抽中的时间加权抽号, 抽样和权重更新都是O(log n)
+
+    号码i的权重为 now - offset[i], offset[i]为其最近抽中时间减去MIN_WEIGHT。
+    两棵树状数组分别保存可抽号码的个数和offset之和, 任一区间的权重和为
+    count * now - sum, 随时间整体增长时无需更新。
+    """
+
+    def __init__(self, numbers, last_times, key=None, now=None):
+        self.numbers = numbers
+        self.key = key
+        self.pool = None
+        self.origin = time.time() if now is None else now
+        if isinstance(numbers, range):
+            self.positions = None
+        else:
+            self.positions = {number: i for i, number in enumerate(numbers)}
+        never = -NEVER_DRAWN_AGE
+        self.offsets = array("d", [
+            (last_times[n] - self.origin if n in last_times else never) - MIN_WEIGHT
+            for n in numbers
+        ])
+        self.reset()
+
+    def state(self):
+        """抽样器的完整状态, 用于重放时得到完全相同的抽样结果"""
+        return {
+            "origin": self.origin,
+            "offsets": self.offsets.tobytes(),
+            "active": bytes(self.active),
+            "counts": self.counts.tree.tobytes(),
+            "sums": self.sums.tree.tobytes(),
+        }
+
+    @classmethod
+    def restore(cls, numbers, state, key=None):
+        sampler = cls.__new__(cls)
+        sampler.numbers = numbers
+        sampler.key = key
+        sampler.pool = None
+        sampler.origin = state["origin"]
+        if isinstance(numbers, range):
+            sampler.positions = None
+        else:
+            sampler.positions = {number: i for i, number in enumerate(numbers)}
+        sampler.offsets = array("d")
+        sampler.offsets.frombytes(state["offsets"])
+        sampler.active = bytearray(state["active"])
+        counts, sums = array("l"), array("d")
+        counts.frombytes(state["counts"])
+        sums.frombytes(state["sums"])
+        sampler.counts = FenwickTree.from_tree(counts)
+        sampler.sums = FenwickTree.from_tree(sums)
+        return sampler
+
+    def reset(self):
+        """所有号码重新变为可抽(新一轮号码池)"""
+        self.active = bytearray(b"\x01") * len(self.numbers)
+        self.counts = FenwickTree([1] * len(self.numbers), "l")
+        self.sums = FenwickTree(self.offsets)
+
+    def __len__(self):
+        return self.counts.prefix(self.counts.size)
+
+    def _position(self, number):
+        if self.positions is None:
+            i = number - self.numbers.start
+            return i if 0 <= i < len(self.numbers) else None
+        return self.positions.get(number)
+
+    def _now(self, now):
+        return (time.time() if now is None else now) - self.origin
+
+    def weight(self, number, now=None):
+        i = self._position(number)
+        if i is None or not self.active[i]:
+            return 0.0
+        return self._now(now) - self.offsets[i]
+
+    def total_weight(self, now=None):
+        return self.counts.prefix(self.counts.size) * self._now(now) - self.sums.prefix(self.sums.size)
+
+    def set_active(self, number, active):
+        i = self._position(number)
+        if i is None or bool(self.active[i]) == active:
+            return False
+        self.active[i] = active
+        sign = 1 if active else -1
+        self.counts.add(i + 1, sign)
+        self.sums.add(i + 1, sign * self.offsets[i])
+        return True
+
+    def touch(self, number, when):
+        """号码在when(时间戳)被抽中, 更新其权重"""
+        i = self._position(number)
+        if i is None:
+            return
+        offset = when - self.origin - MIN_WEIGHT
+        if self.active[i]:
+            self.sums.add(i + 1, offset - self.offsets[i])
+        self.offsets[i] = offset
+
+    def sample(self, rng=random, now=None):
+        """按权重抽样一个可抽号码(不移除), 没有可抽号码时返回None"""
+        t = self._now(now)
+        counts, sums = self.counts.tree, self.sums.tree
+        size = self.counts.size
+        for _ in range(8):
+            total = self.total_weight(now)
+            if total <= 0:
+                return None
+            remaining = rng.random() * total
+            pos = 0
+            step = 1 << size.bit_length()
+            while step:
+                nxt = pos + step
+                if nxt <= size:
+                    w = counts[nxt] * t - sums[nxt]
+                    if w <= remaining:
+                        pos = nxt
+                        remaining -= w
+                step >>= 1
+            # 浮点误差可能落到不可抽的位置, 重新抽样
+            if pos < size and self.active[pos]:
+                return self.numbers[pos]
+        active = [i for i in range(size) if self.active[i]]
+        return self.numbers[rng.choice(active)] if active else None
+
+    def choose(self, pool, skip=(), rng=random, now=None):
+        """从号码池中按权重选出一个不在skip中的号码(不从号码池中移除)
+
+        号码池换成新一轮时所有号码重新可抽; 抽到已不在号码池中的号码时将其标记为不可抽后重抽。
+        """
+        if pool is not self.pool:
+            self.pool = pool
+            self.reset()
+        skipped = [n for n in sorted(skip) if self.set_active(n, False)]
+        try:
+            while True:
+                number = self.sample(rng, now)
+                if number is None or number in pool:
+                    return number
+                self.set_active(number, False)
+        finally:
+            for n in skipped:
+                self.set_active(n, True)
@@ -4,30 +4,106 @@ import traceback
 from datetime import datetime
 from pathlib import Path
 from config.cipher import SimpleCipher
+from config.cipher_stream import iter_records
 from config.cipher import ENCRYPTION_KEY
 
+# 日志级别: 低于当前级别的日志直接丢弃, 不构造内容
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+OFF = 100
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARN: "warn", ERROR: "error"}
+
+
+class SubsystemLogger:
+    """绑定子系统名称的日志入口, 如 log = logger.get("rate")"""
+
+    def __init__(self, manager, subsystem):
+        self.manager = manager
+        self.subsystem = subsystem
+
+    def is_enabled(self, level):
+        return self.manager.is_enabled(level, self.subsystem)
+
+    def debug(self, message):
+        self.manager.write(DEBUG, self.subsystem, message)
+
+    def info(self, message):
+        self.manager.write(INFO, self.subsystem, message)
+
+    def warn(self, message):
+        self.manager.write(WARN, self.subsystem, message)
+
+    def error(self, message):
+        self.manager.write(ERROR, self.subsystem, message)
+
+
 class LogManager:
-    def __init__(self, debug_mode=False):
+    """分级日志: debug / info / warn / error
+
+    message可以是字符串、字典, 或返回二者之一的函数; 传入函数时只有级别启用才调用,
+    诊断信息的构造开销只在需要时才付出。levels按子系统单独设置级别, 未设置的使用level。
+    """
+
+    def __init__(self, debug_mode=False, level=INFO, levels=None):
         self.debug_mode = debug_mode
         self.log_dir = Path("logs") if debug_mode else None
         self.log_file = self.log_dir / "system.log" if debug_mode else None
         self.cipher = SimpleCipher(ENCRYPTION_KEY)
-        
+        self.level = level
+        self.levels = dict(levels or {})  # 子系统 -> 级别
+
         if debug_mode:
             self.log_dir.mkdir(parents=True, exist_ok=True)
-        
-    def log(self, message):
+
+    def set_level(self, level, subsystem=None):
+        """设置默认级别, 指定subsystem时只设置该子系统"""
+        if subsystem is None:
+            self.level = level
+        else:
+            self.levels[subsystem] = level
+
+    def is_enabled(self, level, subsystem=None):
         if not self.debug_mode:
+            return False
+        return level >= self.levels.get(subsystem, self.level)
+
+    def get(self, subsystem):
+        return SubsystemLogger(self, subsystem)
+
+    def debug(self, message, subsystem=None):
+        self.write(DEBUG, subsystem, message)
+
+    def info(self, message, subsystem=None):
+        self.write(INFO, subsystem, message)
+
+    def warn(self, message, subsystem=None):
+        self.write(WARN, subsystem, message)
+
+    def error(self, message, subsystem=None):
+        self.write(ERROR, subsystem, message)
+
+    def log(self, message):
+        """原有接口, 等同于info"""
+        self.write(INFO, None, message)
+
+    def write(self, level, subsystem, message):
+        if not self.is_enabled(level, subsystem):
             return
-            
+        if callable(message):
+            message = message()
+
         if isinstance(message, dict):  # JSON格式日志
             log_data = message
         else:  # 文本格式日志
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             log_data = {"message": f"[{timestamp}] {message}"}
-        
-        # 打印到终端
-        print(json.dumps(log_data, indent=2, ensure_ascii=False))
+        if subsystem is not None or level != INFO:
+            log_data = dict(log_data, level=LEVEL_NAMES[level])
+            if subsystem is not None:
+                log_data["subsystem"] = subsystem
+
         # 明文存储到文件
         if self.log_file:
             try:
@@ -36,19 +112,20 @@ class LogManager:
                     f.write("\n")
             except Exception as e:
                 print(f"Logging failed: {str(e)}")
-    
-    def read_logs(self):
-        if not self.log_file.exists():
+
+    def read_logs(self, limit=None):
+        if not self.log_file or not self.log_file.exists():
             return "No logs found"
-            
+
         with open(self.log_file, "r", encoding="utf-8") as f:
             logs = []
-            for line in f:
-                try:
-                    decrypted = self.cipher.decrypt(line.strip())
-                    logs.append(decrypted)
-                except:
-                    continue
+            for batch in iter_records(f, self.cipher, skip_invalid=True):
+                logs.extend(batch)
+                if limit is not None and len(logs) >= limit:
+                    logs = logs[:limit]
+                    break
             return "\n".join(logs)
 
-logger = LogManager(False)  # 设置为False关闭调试模式
+# 各子系统的日志级别, 未列出的使用默认级别, 例如 {"rate": DEBUG}
+SUBSYSTEM_LEVELS = {}
+logger = LogManager(False, levels=SUBSYSTEM_LEVELS)  # 设置为False关闭调试模式
@@ -1,27 +1,90 @@
-import os
-import pickle
-import json
-import random
 import traceback
 from datetime import datetime
 from collections import defaultdict
+from contextlib import ExitStack
+from core.storage import FileStorage
+from core.rule_writer import RuleWriter, FLUSH_INTERVAL
 from core.log import logger
 
+log = logger.get("rate")
+
 class RateManager:
-    def __init__(self):
+    def __init__(self, storage=None, flush_interval=FLUSH_INTERVAL):
         self.config_folder = "ConfigEngine"
-        self.rate_folder = os.path.join(self.config_folder, "RateSettings")
-        self.chain_folder = os.path.join(self.config_folder, "ChainSettings")
+        self.storage = storage or FileStorage(self.config_folder)
+        # 计数和触发时间的变化交给后台线程合并写回
+        self.writer = RuleWriter(self.storage, flush_interval, on_saved=self.mark_saved)
+        self.rule_stamps = {}       # 规则类型 -> 本实例最后一次读写后存储的状态
         self.pending_target = None  # 待触发的目标号码
-        self.ensure_folders_exist()
+        self.rate_rules = {}        # (模式, 号码) -> 爆率规则
+        self.mode_rate_numbers = defaultdict(set)  # 模式 -> 设有爆率的号码
+        self.chain_rules = {}       # 模式 -> 触发号码 -> 连锁规则
+        self.load_rate_rules()
+        self.load_chain_rules()
 
-    def ensure_folders_exist(self):
-        os.makedirs(self.rate_folder, exist_ok=True)
-        os.makedirs(self.chain_folder, exist_ok=True)
+    def load_rate_rules(self):
+        """把所有爆率规则一次载入内存, 抽号时只读写内存中的表"""
+        try:
+            rules = self.storage.load_rate_rules()
+        except Exception as e:
+            log.error({
+                "error": "读取爆率设置失败",
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+            return False
+        self.mark_saved("rate")
+        self.rate_rules = {}
+        self.mode_rate_numbers = defaultdict(set)
+        for data in rules:
+            self.rate_rules[(data["mode"], data["number"])] = data
+            self.mode_rate_numbers[data["mode"]].add(data["number"])
+        return True
+
+    def load_chain_rules(self):
+        """把连锁规则一次载入内存, 建立 模式 -> 触发号码 -> 规则 的索引"""
+        try:
+            rules = self.storage.load_chain_rules()
+        except Exception as e:
+            log.error({
+                "error": "读取连锁设置失败",
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+            return False
+        self.mark_saved("chain")
+        self.chain_rules = {}
+        for data in rules:
+            self.chain_rules.setdefault(data["mode"], {})[data["trigger"]] = data
+        return True
+
+    def mark_saved(self, kind):
+        """记录自己写入后的存储状态, 之后只有其他程序的修改才会触发重载"""
+        try:
+            self.rule_stamps[kind] = self.storage.change_stamp(kind)
+        except Exception:
+            self.rule_stamps.pop(kind, None)
+
+    def reload_changed(self, kind):
+        """存储中的规则被其他程序修改时, 先写回尚未写入的计数再重新载入该类规则"""
+        with self.writer.exclusive():
+            if self.storage.change_stamp(kind) == self.rule_stamps.get(kind):
+                return False
+            self.writer.flush()
+            if kind == "rate":
+                return self.load_rate_rules()
+            return self.load_chain_rules()
+
+    def flush(self):
+        """立即写回后台线程中尚未写入的计数和连锁触发时间"""
+        return self.writer.flush()
+
+    def close(self):
+        """停止后台写入线程, 写回剩余的更新"""
+        return self.writer.close()
 
     def set_rate(self, mode, number, rate):
         try:
-            rate_file = os.path.join(self.rate_folder, f"{number}.rate")
             data = {
                 "mode": mode,
                 "number": number,
@@ -29,180 +92,209 @@ class RateManager:
                 "count": 0,
                 "last_draw": None
             }
-            with open(rate_file, "wb") as f:
-                pickle.dump(data, f)
+            with self.writer.exclusive():
+                # 新规则覆盖尚未写回的旧计数
+                self.writer.discard("rate", key=(mode, number))
+                self.storage.save_rate_rules([data])
+                self.mark_saved("rate")
+            self.rate_rules[(mode, number)] = data
+            self.mode_rate_numbers[mode].add(number)
             return True
         except Exception:
             return False
 
     def set_chain_rule(self, mode, trigger_number, target_number):
         try:
-            chain_file = os.path.join(self.chain_folder, f"{trigger_number}.chain")
             data = {
                 "mode": mode,
                 "trigger": trigger_number,
                 "target": target_number,
                 "last_draw": None
             }
-            with open(chain_file, "wb") as f:
-                pickle.dump(data, f)
+            with self.writer.exclusive():
+                self.writer.discard("chain", key=(mode, trigger_number))
+                self.storage.save_chain_rules([data])
+                self.mark_saved("chain")
+            self.chain_rules.setdefault(mode, {})[trigger_number] = data
             return True
         except Exception:
             return False
 
-    def check_chain(self, mode, drawn_numbers, available_numbers, gender_numbers=None):
-        chain_files = [f for f in os.listdir(self.chain_folder) if f.endswith(".chain")]
-        triggered = {}
-        for filename in chain_files:
-            try:
-                with open(os.path.join(self.chain_folder, filename), "rb") as f:
-                    data = pickle.load(f)
-                    if (data["mode"] == mode and 
-                        data["trigger"] in drawn_numbers and 
-                        data["target"] in available_numbers):
-                        if gender_numbers is None or data["target"] in gender_numbers:
-                            triggered[data["trigger"]] = {
-                                "target_number": data["target"],
-                                "last_trigger_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "skip_count": True  # 标记为跳过计数
-                            }
-                            data["last_draw"] = datetime.now()
-                            with open(os.path.join(self.chain_folder, filename), "wb") as f2:
-                                pickle.dump(data, f2)
-                            # 设置待触发的目标号码
-                            self.pending_target = data["target"]
-                            print(f"触发连锁规则: {data['trigger']} → {data['target']} (跳过计数)")
-            except Exception as e:
-                logger.log({
-                    "error": "处理连锁文件失败",
-                    "filename": filename,
-                    "exception": str(e),
-                    "traceback": traceback.format_exc()
-                })
-                continue
-        return triggered
+    def get_rate_rule(self, mode, number):
+        """返回该模式下号码爆率规则的副本, 没有时返回None"""
+        data = self.rate_rules.get((mode, number))
+        return dict(data) if data is not None else None
+
+    def _chain_target(self, mode, trigger, available_numbers, gender_numbers, changed):
+        """trigger触发的连锁目标号码(目标不可抽时为None), 并更新该规则的触发时间"""
+        data = self.chain_rules.get(mode, {}).get(trigger)
+        if data is None or data["target"] not in available_numbers:
+            return None
+        if gender_numbers is not None and data["target"] not in gender_numbers:
+            return None
+        data["last_draw"] = datetime.now()
+        changed.add((mode, trigger))
+        return data["target"]
 
-    def check_rate(self, mode, available_numbers, gender_numbers=None):
-        rate_files = [f for f in os.listdir(self.rate_folder) if f.endswith(".rate")]
+    def mode_rate_rules(self, mode, gender_numbers):
+        """该模式下符合性别筛选的爆率规则, 按号码排序(同一随机种子得到相同结果)"""
+        return [self.rate_rules[(mode, number)] for number in sorted(self.mode_rate_numbers.get(mode, ()))
+                if gender_numbers is None or number in gender_numbers]
+
+    def _count_rates(self, mode, rules, available_numbers, changed):
+        """一次抽号的爆率计数, 返回(已触发的号码, 未触发、不能抽出的号码)"""
         triggered_numbers = []
-        rate_info = []
-        normal_numbers = available_numbers.copy()
-        
-        # 处理爆率号码
-        for filename in rate_files:
-            try:
-                with open(os.path.join(self.rate_folder, filename), "rb") as f:
-                    data = pickle.load(f)
-                    if data["mode"] == mode and data["number"] in available_numbers:
-                        if gender_numbers is not None and data["number"] not in gender_numbers:
-                            continue
-                        
-                        # 先检查是否是连锁号码
-                        is_chain_target = False
-                        if self.pending_target and data["number"] == self.pending_target:
-                            is_chain_target = True
-                            
-                        # 更新计数 (连锁目标号码跳过计数)
-                        new_count = data["count"] + (0 if is_chain_target else 1)
-                        is_triggered = (new_count % data["rate"]) == 0
-                        
-                        # 立即保存更新后的计数
-                        data["count"] = new_count
-                        data["last_draw"] = datetime.now()
-                        with open(os.path.join(self.rate_folder, filename), "wb") as f:
-                            pickle.dump(data, f)
-                        
-                        print(f"Rate-controlled number {data['number']} count update: {new_count}/{data['rate']} {'(triggered)' if is_triggered else ''}")
-                        
-                        rate_info.append({
-                            "number": data["number"],
-                            "total_attempts": data["rate"],
-                            "current_count": new_count,
-                            "triggered": is_triggered
-                        })
-                        
-                        if is_triggered:
-                            triggered_numbers.append(data["number"])
-                        else:
-                            # 未触发时从普通号码中移除爆率号码
-                            if data["number"] in normal_numbers:
-                                normal_numbers.remove(data["number"])
-            except Exception as e:
-                logger.log({
-                    "error": "处理爆率文件失败",
-                    "filename": filename,
-                    "exception": str(e),
-                    "traceback": traceback.format_exc()
-                })
+        held_numbers = set()
+        now = datetime.now()
+        for data in rules:
+            number = data["number"]
+            if number not in available_numbers:
                 continue
-        
-        # 抽号优先级: 待触发目标 > 爆率号码 > 普通号码
-        if self.pending_target and self.pending_target in available_numbers:
-            drawn_number = self.pending_target
-            self.pending_target = None  # 清除待触发状态
-            print(f"抽中连锁目标号码: {drawn_number}")
-            
-        elif triggered_numbers:
-            drawn_number = random.choice(triggered_numbers)
-            print(f"抽中爆率号码: {drawn_number}")
-        else:
-            drawn_number = random.choice(normal_numbers) if normal_numbers else random.choice(available_numbers)
-            print(f"Randomly drawn number: {drawn_number}")
-            
-        chain_info = self.check_chain(mode, [drawn_number], available_numbers, gender_numbers)
-        
-        # 改进日志输出
-        output = {
+            # 连锁目标号码跳过计数
+            is_chain_target = bool(self.pending_target) and number == self.pending_target
+            new_count = data["count"] + (0 if is_chain_target else 1)
+            is_triggered = (new_count % data["rate"]) == 0
+            data["count"] = new_count
+            data["last_draw"] = now
+            changed.add((mode, number))
+            if is_triggered:
+                triggered_numbers.append(number)
+            else:
+                # 未触发时从普通号码中移除爆率号码
+                held_numbers.add(number)
+        return triggered_numbers, held_numbers
+
+    def _commit(self, mode, rate_changes, chain_changes):
+        """把变化的规则交给后台线程写回"""
+        for key in rate_changes:
+            self.writer.put("rate", key, self.rate_rules[key])
+        for key in chain_changes:
+            self.writer.put("chain", key, self.chain_rules[mode][key[1]])
+
+    def draw_many(self, mode, k, pool, gender_numbers=None, refill=None, *, rng, sampler=None,
+                  now=None):
+        """一次抽出k个号码, 返回(号码列表, 说明)
+
+        每个号码按 上一个号码的连锁目标 > 待触发目标 > 爆率号码 > 号码池随机 的优先级选出,
+        全部在内存中完成, 变化的规则在最后一次提交给后台线程。
+        pool为号码池(DrawDeck), 抽出的号码从中移除; 抽完一轮时调用refill()取得新一轮的号码池。
+        指定sampler(FairSampler)时, 最后的随机选择改为按距上次被抽中的时间加权(以now为当前时间)。
+        所有随机选择都来自rng(必须指定, 如draw_replay.draw_rng(种子)), 同一种子和同一状态下结果完全相同。
+        说明中记录每个号码的来源和最终的爆率计数。
+        """
+        picks = []
+        steps = []
+        rate_changes = set()
+        chain_changes = set()
+        rules = self.mode_rate_rules(mode, gender_numbers)
+        with ExitStack() as batches:
+            # 号码池的变化在最后各写入一次
+            batches.enter_context(pool.batch())
+            while len(picks) < k:
+                if not len(pool):
+                    # 本轮已抽完, 换新一轮的号码池后继续
+                    if refill is None:
+                        break
+                    pool = batches.enter_context(refill().batch())
+                    pool.remove_many(picks)
+                    if not len(pool):
+                        break
+                if picks:
+                    target = self._chain_target(mode, picks[-1], pool, gender_numbers, chain_changes)
+                    if target is not None:
+                        pool.remove(target)
+                        picks.append(target)
+                        steps.append({"number": target, "source": "chain", "trigger": picks[-2]})
+                        continue
+
+                triggered_numbers, held_numbers = self._count_rates(mode, rules, pool, rate_changes)
+                if self.pending_target and self.pending_target in pool:
+                    number = self.pending_target
+                    self.pending_target = None
+                    pool.remove(number)
+                    source = "chain target"
+                elif triggered_numbers:
+                    number = rng.choice(triggered_numbers)
+                    pool.remove(number)
+                    source = "rate"
+                elif sampler is not None:
+                    number = sampler.choose(pool, held_numbers, rng, now)
+                    if number is None:
+                        number = sampler.choose(pool, rng=rng, now=now)
+                    if number is None:
+                        break
+                    pool.remove(number)
+                    source = "fair"
+                else:
+                    number = pool.pop(skip=held_numbers, rng=rng)
+                    if number is None:
+                        number = pool.pop(rng=rng)
+                    source = "random"
+                picks.append(number)
+                steps.append({"number": number, "source": source})
+
+        # 最后一个号码触发的连锁目标留到下次抽号
+        if picks:
+            target = self._chain_target(mode, picks[-1], pool, gender_numbers, chain_changes)
+            if target is not None:
+                self.pending_target = target
+        self._commit(mode, rate_changes, chain_changes)
+
+        explanation = {
             "mode": mode,
-            "drawn_number": drawn_number,
+            "picks": steps,
             "rate_info": [{
-                "number": r["number"],
-                "total_attempts": r["total_attempts"],
-                "current_count": r["current_count"], 
-                "triggered": r["triggered"]
-            } for r in rate_info],
-            "chain_info": {
-                "trigger_status": "triggered" if chain_info else "not triggered",
-                "trigger_condition": list(chain_info.keys())[0] if chain_info else None,
-                "target_number": list(chain_info.values())[0]["target_number"] if chain_info else None
-            } if chain_info else {
-                "trigger_status": "not triggered",
-                "trigger_condition": None,
-                "target_number": None
-            },
+                "number": data["number"],
+                "total_attempts": data["rate"],
+                "current_count": data["count"],
+            } for data in rules if (mode, data["number"]) in rate_changes],
+            "pending_target": self.pending_target,
             "gender_restriction": "none" if gender_numbers is None else "enabled",
             "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        print("\n抽号系统日志:")
-        print(json.dumps(output, ensure_ascii=False, indent=2))
-    
-        return [drawn_number]
+        log.debug(explanation)
+        return picks, explanation
 
-    def clear_rate_settings(self):
-        """清空所有爆率设置"""
+    def clear_rate_settings(self, mode=None):
+        """清空爆率设置, 指定mode时只清空该模式"""
         try:
-            for filename in os.listdir(self.rate_folder):
-                if filename.endswith(".rate"):
-                    os.remove(os.path.join(self.rate_folder, filename))
+            with self.writer.exclusive():
+                # 先丢弃尚未写回的计数, 避免清空后又被写回
+                self.writer.discard("rate", mode)
+                self.storage.clear_rate_rules(mode)
+                self.mark_saved("rate")
+            if mode is None:
+                self.rate_rules = {}
+                self.mode_rate_numbers = defaultdict(set)
+            else:
+                for number in self.mode_rate_numbers.pop(mode, ()):
+                    self.rate_rules.pop((mode, number), None)
             return True
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "清空爆率设置失败",
+                "mode": mode if mode else "all",
                 "exception": str(e),
                 "traceback": traceback.format_exc()
             })
             return False
 
-    def clear_chain_settings(self):
-        """清空所有连锁设置"""
+    def clear_chain_settings(self, mode=None):
+        """清空连锁设置, 指定mode时只清空该模式"""
         try:
-            for filename in os.listdir(self.chain_folder):
-                if filename.endswith(".chain"):
-                    os.remove(os.path.join(self.chain_folder, filename))
+            with self.writer.exclusive():
+                self.writer.discard("chain", mode)
+                self.storage.clear_chain_rules(mode)
+                self.mark_saved("chain")
+            if mode is None:
+                self.chain_rules = {}
+            else:
+                self.chain_rules.pop(mode, None)
             return True
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "清空连锁设置失败",
+                "mode": mode if mode else "all",
                 "exception": str(e),
                 "traceback": traceback.format_exc()
             })
@@ -215,13 +307,10 @@ class RateManager:
             # 按模式分组存储
             mode_groups = defaultdict(list)
             
-            for filename in os.listdir(self.rate_folder):
-                if filename.endswith(".rate"):
-                    with open(os.path.join(self.rate_folder, filename), "rb") as f:
-                        data = pickle.load(f)
-                        mode_groups[data["mode"]].append(
-                            (data["number"], data["rate"], data["count"], data["last_draw"])
-                        )
+            for data in self.rate_rules.values():
+                mode_groups[data["mode"]].append(
+                    (data["number"], data["rate"], data["count"], data["last_draw"])
+                )
             
             # 转换为admin_panel.py期望的格式
             for mode, rules in mode_groups.items():
@@ -230,7 +319,7 @@ class RateManager:
                     "rules": rules
                 })
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "获取爆率设置失败",
                 "exception": str(e),
                 "traceback": traceback.format_exc()
@@ -244,13 +333,11 @@ class RateManager:
             # 按模式分组存储
             mode_groups = defaultdict(list)
             
-            for filename in os.listdir(self.chain_folder):
-                if filename.endswith(".chain"):
-                    with open(os.path.join(self.chain_folder, filename), "rb") as f:
-                        data = pickle.load(f)
-                        mode_groups[data["mode"]].append(
-                            (data["trigger"], data["target"], data["last_draw"])
-                        )
+            for rules in self.chain_rules.values():
+                for data in rules.values():
+                    mode_groups[data["mode"]].append(
+                        (data["trigger"], data["target"], data["last_draw"])
+                    )
             
             # 转换为admin_panel.py期望的格式
             for mode, rules in mode_groups.items():
@@ -260,7 +347,7 @@ class RateManager:
                 })
                 
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "获取连锁设置失败",
                 "exception": str(e),
                 "traceback": traceback.format_exc()
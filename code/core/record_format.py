@@ -0,0 +1,143 @@
+import os
+import struct
+import sys
+from array import array
+from config.cipher_stream import iter_records, CipherLineWriter
+
+# 二进制抽号记录格式(.rec):
+#   8字节文件头: 魔数"LRB" + 版本号 + 每条记录字节数 + 3字节保留
+#   之后是定长小端无符号整数, 按其在数据区中的偏移与密钥流异或加密。
+# 加密只依赖偏移, 因此追加写入的每一块都可以独立加密, 读取时整段一次解密。
+MAGIC = b"LRB"
+VERSION = 1
+RECORD_WIDTH = 4
+MAX_NUMBER = 2 ** (8 * RECORD_WIDTH) - 1
+HEADER = struct.Struct("<3sBB3x")
+RECORD_KEY = b'xQ9!pL3$kZ8#wR5&vN2^mY7*cU1@qS6%fT4(oJ0)hB9_gD8+eK7-lH6=iO5'
+HEADER_SIZE = HEADER.size
+
+
+def _to_array(data):
+    numbers = array("I")
+    numbers.frombytes(data)
+    if sys.byteorder == "big":
+        numbers.byteswap()
+    return numbers
+
+
+def _to_bytes(numbers):
+    packed = array("I", numbers)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def create_record_file(path):
+    """创建只有文件头的空记录文件(已存在则清空)"""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD_WIDTH))
+
+
+def check_header(data):
+    magic, version, width = HEADER.unpack(data[:HEADER_SIZE])
+    if magic != MAGIC or version != VERSION or width != RECORD_WIDTH:
+        raise ValueError("不支持的记录文件格式")
+
+
+def encode_block(cipher, numbers, offset):
+    """把一组号码编码并加密为数据区offset处的一块"""
+    return cipher.xor_at(_to_bytes(numbers), offset)
+
+
+def decode_block(cipher, data, offset):
+    """解密数据区offset处的一块, 返回号码数组(忽略不完整的尾部记录)"""
+    usable = len(data) - len(data) % RECORD_WIDTH
+    return _to_array(cipher.xor_at(data[:usable], offset))
+
+
+def read_record_file(path, cipher, start=0):
+    """一次读取并批量解码, 按写入顺序返回号码数组
+
+    start为文件内的字节位置, 大于文件头时只解码此后新追加的部分。
+    """
+    with open(path, "rb") as f:
+        check_header(f.read(HEADER_SIZE))
+        offset = max(0, start - HEADER_SIZE)
+        offset -= offset % RECORD_WIDTH
+        f.seek(HEADER_SIZE + offset)
+        data = f.read()
+    return decode_block(cipher, data, offset)
+
+
+def prepare_append(f):
+    """定位到以追加方式打开的记录文件末尾, 返回下一块在数据区中的偏移"""
+    end = f.seek(0, os.SEEK_END)
+    if end < HEADER_SIZE:
+        f.truncate(0)
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD_WIDTH))
+        end = HEADER_SIZE
+    # 丢弃上次异常中断留下的不完整记录
+    offset = (end - HEADER_SIZE) - (end - HEADER_SIZE) % RECORD_WIDTH
+    if HEADER_SIZE + offset != end:
+        f.truncate(HEADER_SIZE + offset)
+    return offset
+
+
+def append_record_file(path, cipher, numbers):
+    """把号码作为一块追加到记录文件末尾"""
+    with open(path, "ab") as f:
+        offset = prepare_append(f)
+        f.write(encode_block(cipher, numbers, offset))
+
+
+def read_legacy_file(path, cipher, start=0):
+    """读取旧版按行base64加密的.txt记录, start为已读取过的字节位置"""
+    numbers = array("I")
+    with open(path, "r") as f:
+        if start:
+            f.seek(start)
+        for batch in iter_records(f, cipher):
+            numbers.extend(int(num) for num in batch)
+    return numbers
+
+
+def append_legacy_file(path, cipher, numbers):
+    """二进制文件不可用时按旧版格式追加"""
+    with open(path, "a") as f:
+        with CipherLineWriter(f, cipher) as writer:
+            writer.write_many(numbers)
+
+
+def record_count(size):
+    """由记录文件大小推算记录条数"""
+    return max(0, size - HEADER_SIZE) // RECORD_WIDTH
+
+
+def unique_in_order(numbers):
+    """去掉重复号码, 保留每个号码第一次出现的顺序"""
+    seen = set()
+    unique = array("I")
+    for number in numbers:
+        if number not in seen:
+            seen.add(number)
+            unique.append(number)
+    return unique
+
+
+def write_record_file(path, cipher, numbers):
+    """写入临时文件并同步后原子替换path, 中途断电时原文件保持不变"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD_WIDTH))
+        f.write(encode_block(cipher, numbers, 0))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def migrate_legacy_file(legacy_path, path, cipher):
+    """把旧版.txt记录转换为二进制格式, 原文件改名为.bak保留"""
+    numbers = read_legacy_file(legacy_path, cipher)
+    write_record_file(path, cipher, numbers)
+    os.replace(legacy_path, legacy_path + ".bak")
+    return len(numbers)
@@ -1,69 +1,160 @@
 import os
+import re
+import time
 import traceback
-from config.cipher import SimpleCipher
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core import record_format, startup_snapshot
+from core.bitset_index import UsedNumberIndex
+from core.record_writer import DEFAULT_DURABILITY
+from core.storage import FileStorage
+from core.draw_deck import DeckStore
+from core.draw_history import DrawHistory, make_event
+from core.fair_sampler import FairSampler
+from core.roster_store import RosterStore
+from core.change_watcher import file_stamp
 from core.log import logger
 
-ENCRYPTION_KEY = b'xQ9!pL3$kZ8#wR5&vN2^mY7*cU1@qS6%fT4(oJ0)hB9_gD8+eK7-lH6=iO5'
+log = logger.get("records")
+
+ENCRYPTION_KEY = record_format.RECORD_KEY
+IMPORT_CHUNK_SIZE = 4096
+IMPORT_WORKERS = 4
+COMPACT_RATIO = 0.25         # 重复记录超过该比例时自动压缩
+COMPACT_MIN_RECORDS = 1024   # 记录太少时不值得压缩
+
+
+def iter_import_chunks(filepath, chunk_size=IMPORT_CHUNK_SIZE):
+    """按块读取导入文件(每行一个数字), 产出(号码列表, 无效行数, 已读字节数)"""
+    with open(filepath, "rb") as f:
+        first = True
+        while True:
+            lines = f.readlines(chunk_size * 8)
+            if not lines:
+                break
+            if first:
+                lines[0] = lines[0].lstrip(b"\xef\xbb\xbf")
+                first = False
+            numbers = []
+            invalid = 0
+            for line in lines:
+                num = line.strip()
+                if num.isdigit() and int(num) <= record_format.MAX_NUMBER:
+                    numbers.append(int(num))
+                elif num:
+                    invalid += 1
+            yield numbers, invalid, f.tell()
+
+
+def parse_import_file(filepath):
+    """完整解析一个导入文件, 返回(号码列表, 无效行数)"""
+    numbers = []
+    invalid = 0
+    for chunk, bad, _ in iter_import_chunks(filepath):
+        numbers.extend(chunk)
+        invalid += bad
+    return numbers, invalid
+
 
 class RecordManager:
-    def __init__(self):
+    def __init__(self, durability=DEFAULT_DURABILITY, storage=None):
         self.config_folder = "ConfigEngine"
         self.record_folder = os.path.join(self.config_folder, "LotteryRecords")
         self.student_folder = os.path.join(self.config_folder, "StudentInfo")
         self.modes = ["模式一", "模式二", "模式三", "模式四", "模式五"]
         self.genders = ["boy", "girl"]
+        self.durability = durability
+        self.storage = storage or FileStorage(self.config_folder, durability)
         self.ensure_folders_exist()
+        self.migrate_legacy_records()
+        self.deck_store = DeckStore(os.path.join(self.record_folder, "Decks"))
         self.used_numbers_cache = {mode: set() for mode in self.modes}
         self.gender_numbers_cache = {gender: set() for gender in self.genders}
-        self.student_info_cache = {}
+        self.roster = RosterStore()
+        self.last_import_summary = None
+        self.last_import_report = None
+        self.history = None
+        self.fair_samplers = {}  # (模式, 性别) -> 按最近抽中时间加权的抽样器
+        self.snapshot_file = os.path.join(self.config_folder, "startup.snap")
+        self.startup_timing = {}
+        start = time.perf_counter()
         self.load_all_records()
-        self.load_student_info()
+        self.startup_timing["records"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.startup_timing["snapshot"] = self.load_student_info()
+        self.startup_timing["students"] = time.perf_counter() - start
 
     def load_all_records(self):
+        """映射各模式的已抽号码位图(位图本身就是按记录文件指纹校验的快照)"""
         for mode in self.modes:
-            self.used_numbers_cache[mode] = self.get_used_numbers(mode)
-        for gender in self.genders:
-            self.gender_numbers_cache[gender] = self.get_gender_numbers(gender)
+            self.used_numbers_cache[mode] = self.open_used_index(mode)
 
-    def load_student_info(self):
-        boy_file = os.path.join(self.student_folder, "boys.txt")
-        girl_file = os.path.join(self.student_folder, "girls.txt")
-        
+    def get_student_files(self):
+        return {gender: os.path.join(self.student_folder, f"{gender}s.txt") for gender in self.genders}
+
+    def load_student_info(self, use_snapshot=True):
+        """一遍读取男女生名单, 同时得到学生信息和各性别的学号集合
+
+        名单文件的大小和修改时间与启动快照一致时直接读取快照, 否则重建并更新快照。
+        返回是否使用了快照。
+        """
+        files = self.get_student_files()
+        sources = list(files.values())
+        if use_snapshot:
+            try:
+                data = startup_snapshot.load_snapshot(self.snapshot_file, sources)
+                if data is not None:
+                    self.roster = RosterStore.from_columns(data)
+                    for gender in self.genders:
+                        self.gender_numbers_cache[gender] = self.roster.gender_numbers(gender)
+                    return True
+            except Exception as e:
+                log.error({
+                    "error": "读取启动快照失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        fingerprints = startup_snapshot.source_fingerprints(sources)
         try:
-            if os.path.exists(boy_file):
-                with open(boy_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) >= 2:
-                            number = int(parts[0])
-                            name = " ".join(parts[1:])
-                            self.student_info_cache[number] = (name, "♂")
-            
-            if os.path.exists(girl_file):
-                with open(girl_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) >= 2:
-                            number = int(parts[0])
-                            name = " ".join(parts[1:])
-                            self.student_info_cache[number] = (name, "♀")
+            self.roster = RosterStore.load(files)
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "加载学生信息失败",
                 "exception": str(e),
                 "traceback": traceback.format_exc()
             })
+            self.roster = RosterStore()
+            return False
+        for gender in self.genders:
+            self.gender_numbers_cache[gender] = self.roster.gender_numbers(gender)
+        try:
+            startup_snapshot.save_snapshot(self.snapshot_file, sources, self.roster.columns(),
+                                           fingerprints)
+        except Exception as e:
+            log.error({
+                "error": "保存启动快照失败",
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+        return False
+
+    def student_stamp(self):
+        """男女生名单文件的(大小, 修改时间, inode)"""
+        return tuple(file_stamp(path) for path in self.get_student_files().values())
+
+    def reload_student_info(self):
+        """名单文件被修改后重新读取(快照指纹不一致, 会重建快照)"""
+        self.load_student_info()
+        return True
+
+    def records_stamp(self):
+        """各模式记录的指纹"""
+        return tuple(self.get_record_fingerprint(mode) for mode in self.modes)
 
     def ensure_folders_exist(self):
         os.makedirs(self.record_folder, exist_ok=True)
         os.makedirs(self.student_folder, exist_ok=True)
         
-        for mode in self.modes:
-            mode_file = os.path.join(self.record_folder, f"{mode}.txt")
-            if not os.path.exists(mode_file):
-                with open(mode_file, "w") as f:
-                    pass
-        
         boy_file = os.path.join(self.student_folder, "boys.txt")
         girl_file = os.path.join(self.student_folder, "girls.txt")
         if not os.path.exists(boy_file):
@@ -73,36 +164,206 @@ class RecordManager:
             with open(girl_file, "w", encoding="utf-8") as f:
                 pass
 
-    def get_record_file(self, mode):
-        return os.path.join(self.record_folder, f"{mode}.txt")
+    def migrate_legacy_records(self):
+        """把旧版.txt记录一次性转换为二进制格式, 返回迁移的模式数"""
+        return self.storage.prepare_records(self.modes)
+
+    def read_records(self, mode):
+        """按写入顺序返回该模式的全部记录"""
+        return self.storage.read_records(mode)
+
+    def write_records(self, mode, numbers):
+        self.storage.append_records(mode, numbers)
+
+    def group_commit(self, mode):
+        """批量抽号时使用: with record_manager.group_commit(mode): ..."""
+        return self.storage.group(mode)
+
+    def flush(self):
+        self.storage.flush()
+
+    def get_index_file(self, mode):
+        return os.path.join(self.record_folder, f"{mode}.bits")
+
+    def get_record_fingerprint(self, mode):
+        """记录的(位置, 版本, 代数), 用于判断位图是否与记录同步"""
+        return self.storage.record_fingerprint(mode)
+
+    def open_used_index(self, mode):
+        """映射该模式的已抽号码位图, 再补读位图之后追加的记录"""
+        current = self.used_numbers_cache.get(mode)
+        if isinstance(current, UsedNumberIndex):
+            current.close()
+        try:
+            index = UsedNumberIndex(self.get_index_file(mode))
+            self.sync_index(mode, index)
+            return index
+        except Exception as e:
+            log.error({
+                "error": "加载号码位图失败",
+                "mode": mode,
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+            return self.get_used_numbers(mode)
+
+    def sync_index(self, mode, index):
+        """让位图追上记录文件, 返回新读取的记录
+
+        同一文件只增长时只解码尾部新增部分; 文件被截断或替换时整体重建。
+        """
+        fingerprint = self.get_record_fingerprint(mode)
+        if fingerprint == index.synced:
+            return []
+        size, _, inode = fingerprint
+        synced_size, _, synced_inode = index.synced
+        start = synced_size if inode == synced_inode and 0 < synced_size <= size else 0
+        if start == 0:
+            index.clear()
+        numbers = self.storage.read_records(mode, start)
+        index.update(numbers)
+        index.mark_synced(fingerprint)
+        return numbers
+
+    def refresh(self, mode=None):
+        """重新同步其他实例或导入追加的记录, 返回新读取的记录条数"""
+        total = 0
+        for m in [mode] if mode else self.modes:
+            index = self.used_numbers_cache[m]
+            try:
+                if isinstance(index, UsedNumberIndex):
+                    numbers = self.sync_index(m, index)
+                    self.discard_from_decks(m, numbers)
+                    total += len(numbers)
+                else:
+                    self.used_numbers_cache[m] = self.get_used_numbers(m)
+            except Exception as e:
+                log.error({
+                    "error": "刷新记录失败",
+                    "mode": m,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return total
+
+    def mark_index_synced(self, mode, before):
+        """自己写入后更新位图指纹; 写入前已有他人追加时改为补读尾部"""
+        index = self.used_numbers_cache[mode]
+        if not isinstance(index, UsedNumberIndex):
+            return
+        if before == index.synced:
+            index.mark_synced(self.get_record_fingerprint(mode))
+        else:
+            self.discard_from_decks(mode, self.sync_index(mode, index))
+
+    def is_used(self, mode, number):
+        return number in self.used_numbers_cache[mode]
+
+    def remaining_count(self, mode, max_num):
+        """1..max_num范围内该模式尚未抽到的号码数量"""
+        index = self.used_numbers_cache[mode]
+        if isinstance(index, UsedNumberIndex):
+            return index.remaining(max_num)
+        return max_num - sum(1 for n in index if 1 <= n <= max_num)
+
+    def close(self):
+        self.storage.close_records()
+        for index in self.used_numbers_cache.values():
+            if isinstance(index, UsedNumberIndex):
+                index.close()
+
+    def record_total(self, mode):
+        """记录条数(含重复)"""
+        return self.storage.record_count(mode)
+
+    def duplicate_ratio(self, mode):
+        """重复记录所占比例: 1 - 不重复号码数 / 记录条数, 只看文件大小和位图计数"""
+        index = self.used_numbers_cache[mode]
+        count = self.record_total(mode)
+        if not isinstance(index, UsedNumberIndex) or not count:
+            return 0.0
+        return max(0.0, 1 - len(index) / count)
+
+    def compact(self, mode=None):
+        """去掉记录中的重复号码, 按首次抽到的顺序原子重写, 返回删除的记录条数
+
+        文件布局先写临时文件再整体替换, SQLite在一个事务中完成, 中途失败时原记录不受影响。
+        压缩期间不应有其他程序实例写入同一记录文件。失败时返回None。
+        """
+        removed = 0
+        for m in [mode] if mode else self.modes:
+            try:
+                if not self.storage.record_count(m):
+                    continue
+                self.refresh(m)
+                numbers = self.storage.read_records(m)
+                unique = record_format.unique_in_order(numbers)
+                if len(unique) == len(numbers):
+                    continue
+                self.storage.rewrite_records(m, unique)
+                removed += len(numbers) - len(unique)
+                # 号码集合不变, 位图和号码池无需重建, 只更新指纹
+                index = self.used_numbers_cache[m]
+                if isinstance(index, UsedNumberIndex):
+                    index.mark_synced(self.get_record_fingerprint(m))
+            except Exception as e:
+                log.error({
+                    "error": "压缩记录失败",
+                    "mode": m,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+                return None
+        return removed
+
+    def maybe_compact(self, mode):
+        """记录较多且重复比例超过COMPACT_RATIO时自动压缩该模式的记录"""
+        if self.record_total(mode) < COMPACT_MIN_RECORDS:
+            return False
+        if self.duplicate_ratio(mode) <= COMPACT_RATIO:
+            return False
+        return bool(self.compact(mode))
+
+    def get_deck(self, mode, gender, max_num):
+        """返回(模式, 性别)的洗牌号码池, 首次建立时跳过该模式已抽过的号码"""
+        if gender:
+            candidates = sorted(n for n in self.gender_numbers_cache[gender] if 1 <= n <= max_num)
+        else:
+            candidates = range(1, max_num + 1)
+        return self.deck_store.get_deck(mode, gender, max_num, candidates,
+                                        self.used_numbers_cache[mode])
+
+    def discard_from_decks(self, mode, numbers):
+        try:
+            self.deck_store.discard(mode, numbers)
+        except Exception as e:
+            log.error({
+                "error": "更新号码池失败",
+                "mode": mode,
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
 
     def get_used_numbers(self, mode):
         try:
-            with open(self.get_record_file(mode), "r") as f:
-                return set(
-                    int(SimpleCipher(ENCRYPTION_KEY).decrypt(line.strip()))
-                    for line in f if line.strip()
-                )
+            return set(self.read_records(mode))
         except Exception:
             return set()
 
     def get_gender_numbers(self, gender):
-        gender_file = os.path.join(self.student_folder, f"{gender}s.txt")
-        try:
-            with open(gender_file, "r", encoding="utf-8") as f:
-                return set(int(line.strip().split()[0]) for line in f if line.strip())
-        except Exception:
-            return set()
+        return self.roster.gender_numbers(gender)
 
-    def add_record(self, mode, numbers):
+    def add_record(self, mode, numbers, gender=None, max_num=None, seed=None, when=None):
+        """写入一次抽号的号码, 并在抽号历史中记录时间、性别筛选、最大号码和随机种子"""
         try:
-            encrypted_lines = [SimpleCipher(ENCRYPTION_KEY).encrypt(str(num)) for num in numbers]
-            with open(self.get_record_file(mode), "a") as f:
-                f.write("\n".join(encrypted_lines) + "\n")
+            before = self.get_record_fingerprint(mode)
+            self.write_records(mode, numbers)
             self.used_numbers_cache[mode].update(numbers)
-            return True
+            self.mark_index_synced(mode, before)
+            self.discard_from_decks(mode, numbers)
+            self.maybe_compact(mode)
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "记录添加失败",
                 "mode": mode,
                 "numbers": numbers,
@@ -110,27 +371,109 @@ class RecordManager:
                 "traceback": traceback.format_exc()
             })
             return False
+        self.add_draw_event(make_event(mode, numbers, gender, max_num, when, seed))
+        return True
 
-    def import_history(self, mode, filepath):
+    def add_draw_event(self, event):
         try:
-            imported = set()
-            with open(filepath, "r") as f:
-                for line in f:
-                    num = line.strip()
-                    if num.isdigit():
-                        imported.add(int(num))
-            
-            if not imported:
-                return False
-                
-            encrypted_lines = [SimpleCipher(ENCRYPTION_KEY).encrypt(str(num)) for num in imported]
-            with open(self.get_record_file(mode), "a") as f:
-                f.write("\n".join(encrypted_lines) + "\n")
-            
-            self.used_numbers_cache[mode].update(imported)
-            return True
+            self.storage.append_draw_event(event)
+            if self.history is not None:
+                self.history.add(event)
+            for (mode, _), sampler in self.fair_samplers.items():
+                if mode == event["mode"]:
+                    for number in event["numbers"]:
+                        sampler.touch(number, event["time"])
         except Exception as e:
-            logger.log({
+            log.error({
+                "error": "记录抽号历史失败",
+                "mode": event["mode"],
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+
+    def get_history(self):
+        """抽号历史在第一次查询时才载入并建立索引"""
+        if self.history is None:
+            try:
+                self.history = DrawHistory(self.storage.load_draw_events())
+            except Exception as e:
+                log.error({
+                    "error": "加载抽号历史失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+                return DrawHistory()
+        return self.history
+
+    def get_fair_sampler(self, mode, gender, deck, now=None):
+        """号码池对应的公平抽样器, 权重取自抽号历史中各号码最近一次被抽中的时间"""
+        key = (deck.max_num, deck.key)
+        sampler = self.fair_samplers.get((mode, gender))
+        if sampler is None or sampler.key != key:
+            sampler = FairSampler(deck.base, self.get_history().last_drawn_times(mode), key, now)
+            self.fair_samplers[(mode, gender)] = sampler
+        return sampler
+
+    def query_draws(self, start=None, end=None, mode=None, number=None):
+        """查询start到end(datetime, 含两端)之间的抽号事件, 可按模式和号码筛选
+
+        返回[{"time": datetime, "mode", "numbers", "gender", "max_num"}, ...], 按时间顺序。
+        重置记录不会清除抽号历史。
+        """
+        return [dict(event, time=datetime.fromtimestamp(event["time"]))
+                for event in self.get_history().query(start, end, mode, number)]
+
+    def draw_count(self, mode, number, start=None, end=None):
+        """号码在该模式(mode为None时为所有模式)下被抽中的次数"""
+        return self.get_history().count(mode, number, start, end)
+
+    def last_drawn(self, mode, number):
+        """号码最近一次被抽中的时间, 从未抽中时返回None"""
+        return self.get_history().last_drawn(mode, number)
+
+    def import_history(self, mode, filepath, progress_callback=None, chunk_size=IMPORT_CHUNK_SIZE):
+        """分块流式导入历史记录, 跳过该模式已有的号码
+
+        每处理完一块调用progress_callback(summary), summary包含
+        read(非空行数) / invalid(无效行数) / duplicate(重复号码数) / written(写入条数)
+        以及bytes_done / bytes_total / done。最终统计同时保存在last_import_summary。
+        文件中没有任何有效号码时返回False。
+        """
+        summary = {"mode": mode, "filepath": filepath, "read": 0, "invalid": 0,
+                   "duplicate": 0, "written": 0, "bytes_done": 0, "bytes_total": 0,
+                   "done": False}
+        self.last_import_summary = summary
+        try:
+            summary["bytes_total"] = os.path.getsize(filepath)
+            used = self.used_numbers_cache[mode]
+            before = self.get_record_fingerprint(mode)
+            for numbers, invalid, bytes_done in iter_import_chunks(filepath, chunk_size):
+                fresh = []
+                seen = set()
+                for num in numbers:
+                    if num in used or num in seen:
+                        summary["duplicate"] += 1
+                    else:
+                        seen.add(num)
+                        fresh.append(num)
+                if fresh:
+                    self.write_records(mode, fresh)
+                    used.update(fresh)
+                    self.discard_from_decks(mode, fresh)
+                summary["read"] += len(numbers) + invalid
+                summary["invalid"] += invalid
+                summary["written"] += len(fresh)
+                summary["bytes_done"] = bytes_done
+                if progress_callback:
+                    progress_callback(dict(summary))
+            self.mark_index_synced(mode, before)
+            self.maybe_compact(mode)
+            summary["done"] = True
+            if progress_callback:
+                progress_callback(dict(summary))
+            return summary["read"] > summary["invalid"]
+        except Exception as e:
+            log.error({
                 "error": "导入历史记录失败",
                 "mode": mode,
                 "filepath": filepath,
@@ -139,20 +482,122 @@ class RecordManager:
             })
             return False
 
+    def mode_for_file(self, filepath, default=None):
+        """按文件名识别导入模式: 文件名包含模式名(如"模式二")或ModeN时返回该模式"""
+        name = os.path.basename(filepath).lower()
+        for i, mode in enumerate(self.modes, 1):
+            if mode in name or re.search(rf"mode{i}(?!\d)", name):
+                return mode
+        return default
+
+    def import_many(self, files, progress_callback=None, max_workers=IMPORT_WORKERS):
+        """并发导入多个文件, files为[(文件路径, 模式), ...]
+
+        依次调用parse_import_files和merge_import, 返回report, 见merge_import。
+        界面中应在后台线程只调用parse_import_files, 再在界面线程调用merge_import。
+        """
+        report, parsed = self.parse_import_files(files, progress_callback, max_workers)
+        return self.merge_import(files, parsed, report, progress_callback)
+
+    def parse_import_files(self, files, progress_callback=None, max_workers=IMPORT_WORKERS):
+        """在线程池中解析各文件, 不读写任何缓存, 可在后台线程中调用
+
+        每解析完一个文件调用progress_callback(report)。
+        返回(report, parsed): parsed按files的顺序为各文件的号码列表, 解析失败的为None。
+        """
+        report = {"files": [], "modes": {}, "parsed": 0, "total": len(files),
+                  "written": 0, "done": False}
+        self.last_import_report = report
+        parsed = [None] * len(files)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(parse_import_file, path): i for i, (path, _) in enumerate(files)}
+            for future in as_completed(futures):
+                i = futures[future]
+                path, mode = files[i]
+                entry = {"filepath": path, "mode": mode, "read": 0, "invalid": 0, "error": None}
+                try:
+                    numbers, invalid = future.result()
+                    parsed[i] = numbers
+                    entry["read"] = len(numbers) + invalid
+                    entry["invalid"] = invalid
+                except Exception as e:
+                    entry["error"] = str(e)
+                    log.error({
+                        "error": "解析导入文件失败",
+                        "filepath": path,
+                        "exception": str(e),
+                        "traceback": traceback.format_exc()
+                    })
+                report["files"].append(entry)
+                report["parsed"] += 1
+                if progress_callback:
+                    progress_callback(report)
+        return report, parsed
+
+    def merge_import(self, files, parsed, report, progress_callback=None):
+        """把parse_import_files的结果按模式合并去重, 每个模式只写入一次
+
+        会修改记录缓存、位图索引和号码池, 必须在抽号所在的线程(界面线程)中调用。
+        返回report: files为每个文件的read/invalid/error, modes为每个模式的
+        files/duplicate/written/error, written为写入总数。
+        """
+        # 按文件给出的顺序合并, 每个模式只写入一次
+        by_mode = {}
+        for (path, mode), numbers in zip(files, parsed):
+            if numbers is not None:
+                by_mode.setdefault(mode, []).append(numbers)
+        for mode, chunks in by_mode.items():
+            result = {"files": len(chunks), "duplicate": 0, "written": 0, "error": None}
+            report["modes"][mode] = result
+            try:
+                used = self.used_numbers_cache[mode]
+                fresh = []
+                seen = set()
+                for numbers in chunks:
+                    for num in numbers:
+                        if num in used or num in seen:
+                            result["duplicate"] += 1
+                        else:
+                            seen.add(num)
+                            fresh.append(num)
+                if fresh:
+                    before = self.get_record_fingerprint(mode)
+                    self.write_records(mode, fresh)
+                    used.update(fresh)
+                    self.mark_index_synced(mode, before)
+                    self.discard_from_decks(mode, fresh)
+                    self.maybe_compact(mode)
+                result["written"] = len(fresh)
+                report["written"] += len(fresh)
+            except Exception as e:
+                result["error"] = str(e)
+                log.error({
+                    "error": "导入历史记录失败",
+                    "mode": mode,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        report["done"] = True
+        if progress_callback:
+            progress_callback(report)
+        return report
+
     def reset_records(self, mode=None):
         try:
             if mode:
-                with open(self.get_record_file(mode), "w") as f:
-                    pass
-                self.used_numbers_cache[mode] = set()
+                self.storage.reset_records(mode)
+                self.used_numbers_cache[mode].clear()
+                self.refresh(mode)
+                self.deck_store.reset(mode)
             else:
                 for m in self.modes:
-                    with open(self.get_record_file(m), "w") as f:
-                        pass
-                    self.used_numbers_cache[m] = set()
+                    self.storage.reset_records(m)
+                    self.used_numbers_cache[m].clear()
+                    self.refresh(m)
+                self.deck_store.reset()
             return True
         except Exception as e:
-            logger.log({
+            log.error({
                 "error": "重置记录失败",
                 "mode": mode if mode else "all",
                 "exception": str(e),
@@ -161,4 +606,8 @@ class RecordManager:
             return False
 
     def get_student_info(self, number):
-        return self.student_info_cache.get(number, ("", ""))
+        return self.roster.get(number, ("", ""))
+
+    def search_students(self, query, limit=20):
+        """按姓名(或学号)查找学生, 返回[(学号, 姓名, 性别符号), ...]"""
+        return self.roster.search(query, limit)
@@ -0,0 +1,133 @@
+import heapq
+import os
+from array import array
+from itertools import compress
+
+GENDER_SYMBOLS = {"boy": "♂", "girl": "♀"}
+GENDER_CODES = {"boy": 1, "girl": 2}
+# 把性别字节数组转换为只在该性别的行为1的掩码
+GENDER_MASKS = {gender: bytes(int(i == code) for i in range(256)) for gender, code in GENDER_CODES.items()}
+MAX_GRAM = 3
+
+
+class RosterStore:
+    """按列存储的学生名单: 学号数组、去重后的姓名表和性别字节数组
+
+    同时为姓名建立前缀/子串索引, 供管理员面板按姓名查找学号。
+    """
+
+    def __init__(self):
+        self.numbers = array("I")
+        self.name_ids = array("I")
+        self.genders = bytearray()
+        self.names = []
+        self.name_table = {}
+        self.rows = {}          # 学号 -> 最后出现的行
+        self.gram_index = {}    # 姓名子串(最长MAX_GRAM个字) -> 姓名编号集合
+        self.name_rows = {}     # 姓名编号 -> 行列表
+
+    @classmethod
+    def load(cls, files):
+        """files为{性别: 名单文件路径}; 每个文件只读一遍"""
+        store = cls()
+        for gender, path in files.items():
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        parts = line.split()
+                        if parts and parts[0].isdigit():
+                            store.add(int(parts[0]), " ".join(parts[1:]), gender)
+        return store
+
+    def columns(self):
+        """名单的各列(只含字符串列表和字节串), 用于启动快照"""
+        return {
+            "numbers": self.numbers.tobytes(),
+            "name_ids": self.name_ids.tobytes(),
+            "genders": bytes(self.genders),
+            "names": list(self.names),
+            "grams": {gram: sorted(ids) for gram, ids in self.gram_index.items()},
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        """由columns()的结果重建名单和姓名索引(不重新切分姓名)"""
+        store = cls()
+        store.numbers.frombytes(columns["numbers"])
+        store.name_ids.frombytes(columns["name_ids"])
+        store.genders = bytearray(columns["genders"])
+        if not len(store.numbers) == len(store.name_ids) == len(store.genders):
+            raise ValueError("名单各列长度不一致")
+        store.names = list(columns["names"])
+        store.name_table = {name: i for i, name in enumerate(store.names)}
+        store.name_rows = name_rows = {i: [] for i in range(len(store.names))}
+        store.gram_index = {gram: set(ids) for gram, ids in columns["grams"].items()}
+        # 学号重复时以最后出现的行为准, 与逐行add一致
+        store.rows = dict(zip(store.numbers, range(len(store.numbers))))
+        for row, name_id in enumerate(store.name_ids):
+            name_rows[name_id].append(row)
+        return store
+
+    def _intern(self, name):
+        name_id = self.name_table.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_table[name] = name_id
+            self.name_rows[name_id] = []
+            for start in range(len(name)):
+                for end in range(start + 1, min(len(name), start + MAX_GRAM) + 1):
+                    self.gram_index.setdefault(name[start:end], set()).add(name_id)
+        return name_id
+
+    def add(self, number, name, gender):
+        row = len(self.numbers)
+        name_id = self._intern(name)
+        self.numbers.append(number)
+        self.name_ids.append(name_id)
+        self.genders.append(GENDER_CODES[gender])
+        self.rows[number] = row
+        self.name_rows[name_id].append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, number, default=("", "")):
+        """返回(姓名, 性别符号), 没有姓名时返回default"""
+        row = self.rows.get(number)
+        if row is None:
+            return default
+        name = self.names[self.name_ids[row]]
+        if not name:
+            return default
+        gender = "boy" if self.genders[row] == GENDER_CODES["boy"] else "girl"
+        return (name, GENDER_SYMBOLS[gender])
+
+    def gender_numbers(self, gender):
+        mask = bytes(self.genders).translate(GENDER_MASKS[gender])
+        return set(compress(self.numbers, mask))
+
+    def search(self, query, limit=20):
+        """按姓名子串查找学生, 姓名以query开头的排在前面; 纯数字时按学号查找
+
+        返回[(学号, 姓名, 性别符号), ...]
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if query.isdigit():
+            rows = [self.rows[int(query)]] if int(query) in self.rows else []
+        else:
+            name_ids = self.gram_index.get(query[:MAX_GRAM], set())
+            if len(query) > MAX_GRAM:
+                name_ids = [i for i in name_ids if query in self.names[i]]
+            ranked = heapq.nsmallest(limit, name_ids,
+                                     key=lambda i: (not self.names[i].startswith(query), self.names[i]))
+            rows = [row for i in ranked for row in self.name_rows[i]
+                    if self.rows.get(self.numbers[row]) == row]
+        results = []
+        for row in rows[:limit]:
+            number = self.numbers[row]
+            name, symbol = self.get(number)
+            results.append((number, name, symbol))
+        return results
@@ -0,0 +1,125 @@
+import io
+import os
+import pickle
+import struct
+from datetime import datetime
+
+# 规则文件(.rates / .chains):
+#   12字节文件头: 魔数"LRUL" + 版本号 + 规则类型 + 模式数 + 规则数
+#   模式表: 每个模式为1字节长度 + UTF-8名称, 规则中以序号引用
+#   之后是定长小端记录:
+#     爆率 模式序号(1) + 号码(4) + 爆率(4) + 计数(4) + 最近抽中时间(8, 微秒时间戳)
+#     连锁 模式序号(1) + 触发号码(4) + 目标号码(4) + 最近触发时间(8)
+# 没有时间时记为NO_TIMESTAMP。整个文件一次读入, 用struct.iter_unpack批量解码。
+MAGIC = b"LRUL"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+HEADER_SIZE = HEADER.size
+KIND_RATE = 1
+KIND_CHAIN = 2
+RECORDS = {
+    KIND_RATE: struct.Struct("<BIIIq"),
+    KIND_CHAIN: struct.Struct("<BIIq"),
+}
+NO_TIMESTAMP = -1
+
+
+def to_micros(value):
+    if value is None:
+        return NO_TIMESTAMP
+    return round(value.timestamp() * 1000000)
+
+
+def from_micros(value):
+    if value == NO_TIMESTAMP:
+        return None
+    return datetime.fromtimestamp(value / 1000000)
+
+
+def is_rule_file(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def pack_rules(kind, rules):
+    """把规则列表编码为一个完整的文件内容"""
+    modes = []
+    mode_ids = {}
+    for rule in rules:
+        if rule["mode"] not in mode_ids:
+            mode_ids[rule["mode"]] = len(modes)
+            modes.append(rule["mode"])
+    if len(modes) > 255:
+        raise ValueError("模式数量超出规则文件格式上限")
+    parts = [HEADER.pack(MAGIC, VERSION, kind, len(modes), len(rules))]
+    for mode in modes:
+        name = mode.encode("utf-8")
+        parts.append(bytes([len(name)]) + name)
+    record = RECORDS[kind]
+    if kind == KIND_RATE:
+        parts.extend(record.pack(mode_ids[r["mode"]], r["number"], r["rate"], r["count"],
+                                 to_micros(r["last_draw"])) for r in rules)
+    else:
+        parts.extend(record.pack(mode_ids[r["mode"]], r["trigger"], r["target"],
+                                 to_micros(r["last_draw"])) for r in rules)
+    return b"".join(parts)
+
+
+def unpack_rules(kind, data):
+    """解码整个文件内容, 返回规则字典列表"""
+    magic, version, file_kind, mode_count, rule_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or file_kind != kind:
+        raise ValueError("不支持的规则文件格式")
+    pos = HEADER_SIZE
+    modes = []
+    for _ in range(mode_count):
+        length = data[pos]
+        modes.append(data[pos + 1:pos + 1 + length].decode("utf-8"))
+        pos += 1 + length
+    record = RECORDS[kind]
+    end = pos + rule_count * record.size
+    if len(data) < end:
+        raise ValueError("规则文件不完整")
+    body = memoryview(data)[pos:end]
+    if kind == KIND_RATE:
+        return [{"mode": modes[m], "number": number, "rate": rate, "count": count,
+                 "last_draw": from_micros(ts)}
+                for m, number, rate, count, ts in record.iter_unpack(body)]
+    return [{"mode": modes[m], "trigger": trigger, "target": target,
+             "last_draw": from_micros(ts)}
+            for m, trigger, target, ts in record.iter_unpack(body)]
+
+
+def read_rules(path, kind):
+    """一次读取整个规则文件; 文件不存在时返回空列表"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    return unpack_rules(kind, data)
+
+
+def write_rules(path, kind, rules):
+    """写入临时文件后原子替换; 没有规则时删除文件"""
+    if not rules:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pack_rules(kind, rules))
+    os.replace(tmp_path, path)
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    # 旧版规则只包含字典、数字、字符串和datetime, 拒绝其他任何类型
+    def find_class(self, module, name):
+        if module == "datetime" and name == "datetime":
+            return datetime
+        raise pickle.UnpicklingError(f"旧版规则文件中包含不允许的类型: {module}.{name}")
+
+
+def load_legacy_rules(data):
+    """解码旧版pickle规则(单条规则字典或规则列表), 返回规则列表"""
+    value = _LegacyUnpickler(io.BytesIO(data)).load()
+    return value if isinstance(value, list) else [value]
@@ -0,0 +1,111 @@
+import threading
+import traceback
+from contextlib import contextmanager
+from core.log import logger
+
+log = logger.get("rate")
+
+FLUSH_INTERVAL = 2.0  # 后台写回间隔(秒)
+
+
+class RuleWriter:
+    """在后台线程中写回爆率计数和连锁触发时间
+
+    put只把规则副本放入待写表, 同一条规则的多次更新合并为最后一次;
+    后台线程在第一次更新后等待interval秒再统一写回, 抽号的主线程不等待磁盘。
+    每写回一种规则后调用on_saved(类型)。
+    """
+
+    def __init__(self, storage, interval=FLUSH_INTERVAL, on_saved=None):
+        self.storage = storage
+        self.interval = interval
+        self.on_saved = on_saved
+        self.pending = {"rate": {}, "chain": {}}  # 类型 -> (模式, 号码) -> 规则副本
+        self.lock = threading.Lock()         # 保护待写表
+        self.write_lock = threading.RLock()  # 串行化对存储中规则的写入
+        self.queued = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def put(self, kind, key, rule):
+        with self.lock:
+            self.pending[kind][key] = dict(rule)
+            if self.thread is None and not self.stopping.is_set():
+                self.thread = threading.Thread(target=self._run, name="RuleWriter", daemon=True)
+                self.thread.start()
+        self.queued.set()
+
+    def discard(self, kind, mode=None, key=None):
+        """丢弃尚未写回的更新: 指定key时只丢弃该规则, 指定mode时丢弃该模式, 都不指定时全部丢弃"""
+        with self.lock:
+            pending = self.pending[kind]
+            if key is not None:
+                pending.pop(key, None)
+            elif mode is not None:
+                for k in [k for k in pending if k[0] == mode]:
+                    del pending[k]
+            else:
+                pending.clear()
+
+    @contextmanager
+    def exclusive(self):
+        """同步修改存储中的规则时使用, 期间后台线程不会写入"""
+        with self.write_lock:
+            yield
+
+    def has_pending(self):
+        with self.lock:
+            return bool(self.pending["rate"] or self.pending["chain"])
+
+    def flush(self):
+        """立即写回所有待写的更新, 失败的更新留在待写表中下次重试"""
+        with self.write_lock:
+            with self.lock:
+                batch = self.pending
+                self.pending = {"rate": {}, "chain": {}}
+            try:
+                if batch["rate"]:
+                    self.storage.save_rate_rules(list(batch["rate"].values()))
+                    batch["rate"] = {}
+                    self._saved("rate")
+                if batch["chain"]:
+                    self.storage.save_chain_rules(list(batch["chain"].values()))
+                    self._saved("chain")
+                return True
+            except Exception as e:
+                with self.lock:
+                    # 期间有更新的规则以新的为准
+                    for kind, rules in batch.items():
+                        for key, rule in rules.items():
+                            self.pending[kind].setdefault(key, rule)
+                log.error({
+                    "error": "保存爆率计数失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+                return False
+
+    def _saved(self, kind):
+        if self.on_saved is not None:
+            self.on_saved(kind)
+
+    def _run(self):
+        while True:
+            self.queued.wait()
+            # 等待一个间隔, 把这段时间内的更新合并成一次写入
+            self.stopping.wait(self.interval)
+            self.queued.clear()
+            self.flush()
+            if self.stopping.is_set():
+                return
+
+    def close(self):
+        """停止后台线程并写回剩余的更新"""
+        self.stopping.set()
+        self.queued.set()
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            self.thread = None
+        return self.flush()
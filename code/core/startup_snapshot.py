@@ -0,0 +1,84 @@
+import json
+import os
+import struct
+
+# 启动快照文件(.snap):
+#   8字节文件头: 魔数"LSNP" + 版本号 + 3字节保留
+#   4字节JSON长度 + JSON: {"fingerprints": {源文件: [大小, 修改时间]}, "data": 缓存内容, "blobs": [[键, 长度], ...]}
+#   之后依次是blobs中各字节串
+# 缓存内容只能是JSON数据, 其中顶层的字节串值单独存放在JSON之后; 读取时不执行任何代码。
+# 源文件的大小和修改时间都与快照记录一致时直接使用快照, 否则由调用方重建。
+MAGIC = b"LSNP"
+VERSION = 2
+HEADER = struct.Struct("<4sB3x")
+HEADER_SIZE = HEADER.size
+META_SIZE = struct.Struct("<I")
+
+
+def file_fingerprint(path):
+    """文件的(大小, 修改时间), 文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def source_fingerprints(paths):
+    return {path: file_fingerprint(path) for path in paths}
+
+
+def _plain_fingerprints(fingerprints):
+    return {path: list(fp) if fp is not None else None for path, fp in fingerprints.items()}
+
+
+def load_snapshot(path, sources):
+    """一次读取快照; 源文件指纹全部一致时返回缓存内容, 否则返回None"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        magic, version = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        meta_size, = META_SIZE.unpack_from(data, HEADER_SIZE)
+        pos = HEADER_SIZE + META_SIZE.size
+        meta = json.loads(data[pos:pos + meta_size].decode("utf-8"))
+        pos += meta_size
+        if meta.get("fingerprints") != _plain_fingerprints(source_fingerprints(sources)):
+            return None
+        content = meta["data"]
+        for key, size in meta["blobs"]:
+            if pos + size > len(data):
+                return None
+            content[key] = data[pos:pos + size]
+            pos += size
+    except Exception:
+        return None
+    return content
+
+
+def save_snapshot(path, sources, data, fingerprints=None):
+    """写入临时文件后原子替换
+
+    fingerprints应为读取源文件之前取得的指纹, 读取期间源文件被修改时下次启动会重建。
+    """
+    if fingerprints is None:
+        fingerprints = source_fingerprints(sources)
+    plain = {key: value for key, value in data.items() if not isinstance(value, bytes)}
+    blobs = [(key, value) for key, value in data.items() if isinstance(value, bytes)]
+    meta = json.dumps({
+        "fingerprints": _plain_fingerprints(fingerprints),
+        "data": plain,
+        "blobs": [[key, len(value)] for key, value in blobs],
+    }, ensure_ascii=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION))
+        f.write(META_SIZE.pack(len(meta)))
+        f.write(meta)
+        for _, value in blobs:
+            f.write(value)
+    os.replace(tmp_path, path)
@@ -0,0 +1,780 @@
+import json
+import os
+import sqlite3
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from config.cipher import SimpleCipher
+from config.cipher_stream import iter_blob_lines, iter_records, CipherLineWriter
+from core import record_format, rule_format
+from core.password_manager import ENCRYPTION_KEY as TIME_KEY
+from core.record_writer import RecordWriter, DEFAULT_DURABILITY, DURABILITY_NONE, DURABILITY_FSYNC
+from core.change_watcher import file_stamp, folder_stamp
+from core.log import logger
+
+log = logger.get("storage")
+
+# 存储后端:
+#   file    原有的文件布局(每个模式一个.rates和.chains规则文件, 每个模式一个.rec记录文件, time_ranges.enc)
+#   sqlite  单个SQLite数据库(WAL模式), 规则和记录按(模式, 号码)建立索引, 多步更新在一个事务中完成
+# 规则统一用字典表示:
+#   爆率 {"mode", "number", "rate", "count", "last_draw"}
+#   连锁 {"mode", "trigger", "target", "last_draw"}
+STORAGE_FILE = "file"
+STORAGE_SQLITE = "sqlite"
+DATABASE_NAME = "lottery.db"
+# 规则类型 -> (所在目录属性, 文件扩展名, 规则在模式内的键, 旧版单条规则文件扩展名, 文件格式中的类型)
+RULE_TYPES = {
+    "rate": ("rate_folder", ".rates", "number", ".rate", rule_format.KIND_RATE),
+    "chain": ("chain_folder", ".chains", "trigger", ".chain", rule_format.KIND_CHAIN),
+}
+
+
+class RuleStorage(ABC):
+    """爆率和连锁规则的存储接口(RateManager只使用这一部分)"""
+
+    @abstractmethod
+    def load_rate_rules(self, mode=None):
+        pass
+
+    @abstractmethod
+    def get_rate_rule(self, mode, number):
+        pass
+
+    @abstractmethod
+    def save_rate_rules(self, rules):
+        pass
+
+    @abstractmethod
+    def clear_rate_rules(self, mode=None):
+        pass
+
+    @abstractmethod
+    def load_chain_rules(self, mode=None):
+        pass
+
+    @abstractmethod
+    def get_chain_rule(self, mode, trigger):
+        pass
+
+    @abstractmethod
+    def save_chain_rules(self, rules):
+        pass
+
+    @abstractmethod
+    def clear_chain_rules(self, mode=None):
+        pass
+
+    # 变化检测
+    def change_stamp(self, source):
+        """数据源("rate" / "chain" / "time")的状态, 内容被修改后必然不同, 不读取内容
+
+        不支持变化检测的后端始终返回None, 不会触发重载。
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class Storage(RuleStorage):
+    """RateManager / RecordManager / TimeRestriction共用的存储接口
+
+    记录指纹为(位置, 版本, 代数): 代数不变且位置增长时, read_records(mode, 旧位置)
+    只返回此后追加的记录; 代数变化说明记录被重置或改写, 需要整体重读。
+    """
+
+    # 抽号记录
+    def prepare_records(self, modes):
+        """确保各模式的记录可用(如迁移旧格式), 返回迁移的模式数"""
+        return 0
+
+    @abstractmethod
+    def record_modes(self):
+        """已有记录的模式"""
+
+    @abstractmethod
+    def read_records(self, mode, start=0):
+        pass
+
+    @abstractmethod
+    def append_records(self, mode, numbers):
+        pass
+
+    @abstractmethod
+    def group(self, mode):
+        """组提交: 范围内追加的记录合并为一次写入"""
+
+    @abstractmethod
+    def record_fingerprint(self, mode):
+        pass
+
+    @abstractmethod
+    def record_count(self, mode):
+        """记录条数(含重复)"""
+
+    @abstractmethod
+    def rewrite_records(self, mode, numbers):
+        """原子地用numbers替换该模式的全部记录"""
+
+    @abstractmethod
+    def reset_records(self, mode):
+        pass
+
+    def flush(self):
+        pass
+
+    def close_records(self):
+        """写出并释放记录写入器, 之后仍可继续使用"""
+        pass
+
+    # 抽号事件历史
+    @abstractmethod
+    def append_draw_event(self, event):
+        """追加一次抽号事件(见draw_history.make_event)"""
+
+    @abstractmethod
+    def load_draw_events(self):
+        pass
+
+    # 禁止时间段
+    @abstractmethod
+    def load_time_ranges(self):
+        """返回[(开始时, 开始分, 结束时, 结束分), ...], 尚未保存过时返回None"""
+
+    @abstractmethod
+    def save_time_ranges(self, ranges):
+        pass
+
+    def close(self):
+        self.close_records()
+
+
+class FileStorage(Storage):
+    """原有的文件布局"""
+
+    def __init__(self, config_folder="ConfigEngine", durability=DEFAULT_DURABILITY):
+        self.config_folder = config_folder
+        self.record_folder = os.path.join(config_folder, "LotteryRecords")
+        self.rate_folder = os.path.join(config_folder, "RateSettings")
+        self.chain_folder = os.path.join(config_folder, "ChainSettings")
+        self.time_folder = os.path.join(config_folder, "TimeRestrictions")
+        self.time_file = os.path.join(self.time_folder, "time_ranges.enc")
+        self.history_file = os.path.join(self.record_folder, "history.log")
+        self.record_cipher = SimpleCipher(record_format.RECORD_KEY)
+        self.time_cipher = SimpleCipher(TIME_KEY)
+        self.durability = durability
+        self.writers = {}
+        for folder in (self.record_folder, self.rate_folder, self.chain_folder, self.time_folder):
+            os.makedirs(folder, exist_ok=True)
+        self.migrate_rule_files()
+
+    # 抽号记录
+    def get_record_file(self, mode):
+        return os.path.join(self.record_folder, f"{mode}.rec")
+
+    def get_legacy_record_file(self, mode):
+        return os.path.join(self.record_folder, f"{mode}.txt")
+
+    def prepare_records(self, modes):
+        """把旧版.txt记录一次性转换为二进制格式, 返回迁移的模式数"""
+        migrated = 0
+        for mode in modes:
+            record_file = self.get_record_file(mode)
+            legacy_file = self.get_legacy_record_file(mode)
+            try:
+                if os.path.exists(legacy_file) and not os.path.exists(record_file):
+                    record_format.migrate_legacy_file(legacy_file, record_file, self.record_cipher)
+                    migrated += 1
+                if not os.path.exists(record_file) and not os.path.exists(legacy_file):
+                    record_format.create_record_file(record_file)
+            except Exception as e:
+                log.error({
+                    "error": "迁移旧版记录失败",
+                    "mode": mode,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return migrated
+
+    def record_modes(self):
+        modes = []
+        for filename in sorted(os.listdir(self.record_folder)):
+            mode, ext = os.path.splitext(filename)
+            if ext in (".rec", ".txt") and mode not in modes:
+                modes.append(mode)
+        return modes
+
+    def read_records(self, mode, start=0):
+        """按写入顺序返回记录, start为已读取过的文件位置; 迁移失败时回退读取旧版.txt"""
+        record_file = self.get_record_file(mode)
+        if mode in self.writers:
+            self.writers[mode].flush(sync=False)
+        if os.path.exists(record_file):
+            return record_format.read_record_file(record_file, self.record_cipher, start)
+        return record_format.read_legacy_file(self.get_legacy_record_file(mode), self.record_cipher, start)
+
+    def append_records(self, mode, numbers):
+        if os.path.exists(self.get_record_file(mode)):
+            self.get_writer(mode).append(numbers)
+        else:
+            record_format.append_legacy_file(self.get_legacy_record_file(mode), self.record_cipher, numbers)
+
+    def get_writer(self, mode):
+        writer = self.writers.get(mode)
+        if writer is None:
+            writer = RecordWriter(self.get_record_file(mode), self.record_cipher, self.durability)
+            self.writers[mode] = writer
+        return writer
+
+    def close_writer(self, mode):
+        writer = self.writers.pop(mode, None)
+        if writer is not None:
+            writer.close()
+
+    def group(self, mode):
+        return self.get_writer(mode).group()
+
+    def record_fingerprint(self, mode):
+        """当前生效记录文件的(大小, 修改时间, inode)"""
+        for path in (self.get_record_file(mode), self.get_legacy_record_file(mode)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return (st.st_size, st.st_mtime_ns, st.st_ino)
+        return (0, 0, 0)
+
+    def record_count(self, mode):
+        """由文件大小推算记录条数, 加上写入器中尚未写出的部分"""
+        record_file = self.get_record_file(mode)
+        if not os.path.exists(record_file):
+            return 0
+        count = record_format.record_count(os.path.getsize(record_file))
+        if mode in self.writers:
+            count += len(self.writers[mode].pending)
+        return count
+
+    def rewrite_records(self, mode, numbers):
+        self.close_writer(mode)
+        record_format.write_record_file(self.get_record_file(mode), self.record_cipher, numbers)
+
+    def reset_records(self, mode):
+        self.close_writer(mode)
+        record_format.create_record_file(self.get_record_file(mode))
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close_records(self):
+        for mode in list(self.writers):
+            self.close_writer(mode)
+
+    # 爆率和连锁规则: 每个模式每种规则一个文件(<模式>.rates / <模式>.chains),
+    # 整个文件先写临时文件再原子替换, 按模式清空、列出和替换都只涉及一个文件
+    def get_rule_path(self, kind, mode):
+        folder, ext = RULE_TYPES[kind][:2]
+        return os.path.join(getattr(self, folder), f"{mode}{ext}")
+
+    def _read_rule_file(self, kind, path):
+        return rule_format.read_rules(path, RULE_TYPES[kind][4])
+
+    def _write_rule_file(self, kind, path, rules):
+        rule_format.write_rules(path, RULE_TYPES[kind][4], rules)
+
+    def _rule_modes(self, kind):
+        folder, ext = RULE_TYPES[kind][:2]
+        return [filename[:-len(ext)] for filename in os.listdir(getattr(self, folder))
+                if filename.endswith(ext)]
+
+    def _load_rules(self, kind, mode):
+        rules = []
+        for m in [mode] if mode is not None else self._rule_modes(kind):
+            try:
+                rules.extend(self._read_rule_file(kind, self.get_rule_path(kind, m)))
+            except Exception as e:
+                log.error({
+                    "error": "读取规则文件失败",
+                    "mode": m,
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return rules
+
+    def _get_rule(self, kind, mode, key):
+        field = RULE_TYPES[kind][2]
+        for rule in self._read_rule_file(kind, self.get_rule_path(kind, mode)):
+            if rule[field] == key:
+                return rule
+        return None
+
+    def _save_rules(self, kind, rules):
+        """按模式合并: 每个涉及的模式读写一次文件"""
+        field = RULE_TYPES[kind][2]
+        by_mode = {}
+        for rule in rules:
+            by_mode.setdefault(rule["mode"], []).append(rule)
+        for mode, changed in by_mode.items():
+            path = self.get_rule_path(kind, mode)
+            merged = {rule[field]: rule for rule in self._read_rule_file(kind, path)}
+            for rule in changed:
+                merged[rule[field]] = rule
+            self._write_rule_file(kind, path, sorted(merged.values(), key=lambda r: r[field]))
+
+    def _clear_rules(self, kind, mode):
+        for m in [mode] if mode is not None else self._rule_modes(kind):
+            path = self.get_rule_path(kind, m)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def migrate_rule_files(self):
+        """把旧版pickle规则转换为定长格式, 返回迁移的规则数
+
+        包括每条规则一个的.rate/.chain文件和按模式保存的pickle格式.rates/.chains文件。
+        旧文件只用受限的解码器读取一次, 新文件写好后才删除。
+        """
+        migrated = 0
+        for kind, (folder, ext, field, legacy_ext, _) in RULE_TYPES.items():
+            folder = getattr(self, folder)
+            legacy_files = []
+            for filename in os.listdir(folder):
+                path = os.path.join(folder, filename)
+                if filename.endswith(legacy_ext):
+                    legacy_files.append(path)
+                elif filename.endswith(ext):
+                    with open(path, "rb") as f:
+                        if not rule_format.is_rule_file(f.read(len(rule_format.MAGIC))):
+                            legacy_files.append(path)
+            if not legacy_files:
+                continue
+            rules = []
+            unreadable = set()
+            for path in legacy_files:
+                try:
+                    with open(path, "rb") as f:
+                        rules.extend(rule_format.load_legacy_rules(f.read()))
+                except Exception as e:
+                    unreadable.add(path)
+                    log.error({
+                        "error": "读取旧版规则文件失败",
+                        "filename": path,
+                        "exception": str(e),
+                        "traceback": traceback.format_exc()
+                    })
+            try:
+                by_mode = {}
+                for rule in rules:
+                    by_mode.setdefault(rule["mode"], {})[rule[field]] = rule
+                written = set()
+                for mode, merged in by_mode.items():
+                    path = self.get_rule_path(kind, mode)
+                    if path in unreadable:
+                        os.replace(path, path + ".bak")
+                    elif path not in legacy_files:
+                        # 已有新格式文件时以其中的规则为准
+                        for rule in self._read_rule_file(kind, path):
+                            merged[rule[field]] = rule
+                    self._write_rule_file(kind, path, sorted(merged.values(), key=lambda r: r[field]))
+                    written.add(path)
+                for path in legacy_files:
+                    if path in unreadable:
+                        # 无法读取的旧文件改名保留, 不再重复迁移
+                        if os.path.exists(path):
+                            os.replace(path, path + ".bak")
+                    elif path not in written:
+                        os.remove(path)
+                migrated += len(rules)
+            except Exception as e:
+                log.error({
+                    "error": "迁移旧版规则文件失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return migrated
+
+    def load_rate_rules(self, mode=None):
+        return self._load_rules("rate", mode)
+
+    def get_rate_rule(self, mode, number):
+        return self._get_rule("rate", mode, number)
+
+    def save_rate_rules(self, rules):
+        self._save_rules("rate", rules)
+
+    def clear_rate_rules(self, mode=None):
+        self._clear_rules("rate", mode)
+
+    def load_chain_rules(self, mode=None):
+        return self._load_rules("chain", mode)
+
+    def get_chain_rule(self, mode, trigger):
+        return self._get_rule("chain", mode, trigger)
+
+    def save_chain_rules(self, rules):
+        self._save_rules("chain", rules)
+
+    def clear_chain_rules(self, mode=None):
+        self._clear_rules("chain", mode)
+
+    # 抽号事件历史: 每行一个加密的JSON事件, 只追加
+    def append_draw_event(self, event):
+        with open(self.history_file, "a") as f:
+            with CipherLineWriter(f, self.record_cipher) as writer:
+                writer.write(json.dumps(event, ensure_ascii=False))
+
+    def load_draw_events(self):
+        if not os.path.exists(self.history_file):
+            return []
+        events = []
+        with open(self.history_file, "r") as f:
+            for batch in iter_records(f, self.record_cipher, skip_invalid=True):
+                for line in batch:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return events
+
+    # 禁止时间段: 加密的文本文件, 每行"开始时 开始分 结束时 结束分"
+    def load_time_ranges(self):
+        if not os.path.exists(self.time_file):
+            return None
+        ranges = []
+        with open(self.time_file, "r") as f:
+            for line in iter_blob_lines(f, self.time_cipher):
+                parts = line.strip().split()
+                if len(parts) == 4:
+                    ranges.append(tuple(map(int, parts)))
+        return ranges
+
+    def save_time_ranges(self, ranges):
+        content = "\n".join(f"{r[0]} {r[1]} {r[2]} {r[3]}" for r in ranges)
+        with open(self.time_file, "w") as f:
+            f.write(self.time_cipher.encrypt(content))
+
+    def change_stamp(self, source):
+        """各文件的(大小, 修改时间, inode)"""
+        if source == "time":
+            return file_stamp(self.time_file)
+        folder_attr, suffix = RULE_TYPES[source][:2]
+        return folder_stamp(getattr(self, folder_attr), suffix)
+
+
+def _to_text(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class SqliteStorage(Storage):
+    """SQLite存储: WAL模式, 记录和规则都按(模式, 号码)建立索引
+
+    连接可在多个线程间共享(如后台导入), 所有操作由一把锁串行化。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mode TEXT NOT NULL,
+            number INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS records_mode_number ON records (mode, number);
+        CREATE INDEX IF NOT EXISTS records_mode_id ON records (mode, id);
+        CREATE TABLE IF NOT EXISTS record_generations (
+            mode TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS rate_rules (
+            mode TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            rate INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            last_draw TEXT,
+            PRIMARY KEY (mode, number)
+        );
+        CREATE TABLE IF NOT EXISTS chain_rules (
+            mode TEXT NOT NULL,
+            trigger_number INTEGER NOT NULL,
+            target INTEGER NOT NULL,
+            last_draw TEXT,
+            PRIMARY KEY (mode, trigger_number)
+        );
+        CREATE TABLE IF NOT EXISTS time_ranges (
+            position INTEGER PRIMARY KEY,
+            start_hour INTEGER NOT NULL,
+            start_minute INTEGER NOT NULL,
+            end_hour INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS draw_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            time REAL NOT NULL,
+            mode TEXT NOT NULL,
+            gender TEXT,
+            max_num INTEGER,
+            numbers TEXT NOT NULL,
+            seed INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS draw_events_time ON draw_events (time);
+        -- 抽号历史的查询都在内存中的DrawHistory完成, 数据库只按时间顺序整体读取
+        DROP INDEX IF EXISTS draw_events_mode_time;
+        DROP TABLE IF EXISTS draw_event_numbers;
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS change_stamps (
+            source TEXT PRIMARY KEY,
+            stamp INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path, durability=DEFAULT_DURABILITY):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # 与文件记录的持久化策略对应
+        if durability == DURABILITY_NONE:
+            self.conn.execute("PRAGMA synchronous=OFF")
+        elif durability == DURABILITY_FSYNC:
+            self.conn.execute("PRAGMA synchronous=FULL")
+        else:
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(draw_events)")]
+        if "seed" not in columns:
+            # 早期数据库的抽号事件没有随机种子
+            self.conn.execute("ALTER TABLE draw_events ADD COLUMN seed INTEGER")
+
+    @contextmanager
+    def transaction(self):
+        """可嵌套的事务, 最外层结束时提交, 出错时整体回滚"""
+        with self.lock:
+            if not self.depth:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self.depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self.depth -= 1
+                if not self.depth:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self.depth -= 1
+            if not self.depth:
+                self.conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # 抽号记录
+    def record_modes(self):
+        return [row[0] for row in self.query("SELECT DISTINCT mode FROM records")]
+
+    def read_records(self, mode, start=0):
+        rows = self.query("SELECT number FROM records WHERE mode = ? AND id > ? ORDER BY id",
+                          (mode, start))
+        return [row[0] for row in rows]
+
+    def append_records(self, mode, numbers):
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO records (mode, number) VALUES (?, ?)",
+                             [(mode, int(n)) for n in numbers])
+
+    def group(self, mode):
+        return self.transaction()
+
+    def _generation(self, mode):
+        rows = self.query("SELECT generation FROM record_generations WHERE mode = ?", (mode,))
+        return rows[0][0] if rows else 0
+
+    def _next_generation(self, conn, mode):
+        conn.execute("INSERT INTO record_generations (mode, generation) VALUES (?, 1) "
+                     "ON CONFLICT (mode) DO UPDATE SET generation = generation + 1", (mode,))
+
+    def record_fingerprint(self, mode):
+        """(最大记录编号, 0, 代数)"""
+        with self.lock:
+            rows = self.query("SELECT MAX(id) FROM records WHERE mode = ?", (mode,))
+            return (rows[0][0] or 0, 0, self._generation(mode))
+
+    def record_count(self, mode):
+        return self.query("SELECT COUNT(*) FROM records WHERE mode = ?", (mode,))[0][0]
+
+    def rewrite_records(self, mode, numbers):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM records WHERE mode = ?", (mode,))
+            conn.executemany("INSERT INTO records (mode, number) VALUES (?, ?)",
+                             [(mode, int(n)) for n in numbers])
+            self._next_generation(conn, mode)
+
+    def reset_records(self, mode):
+        self.rewrite_records(mode, [])
+
+    # 爆率和连锁规则
+    @staticmethod
+    def _rate_rule(row):
+        mode, number, rate, count, last_draw = row
+        return {"mode": mode, "number": number, "rate": rate, "count": count,
+                "last_draw": _to_datetime(last_draw)}
+
+    @staticmethod
+    def _chain_rule(row):
+        mode, trigger, target, last_draw = row
+        return {"mode": mode, "trigger": trigger, "target": target,
+                "last_draw": _to_datetime(last_draw)}
+
+    def load_rate_rules(self, mode=None):
+        sql = "SELECT mode, number, rate, count, last_draw FROM rate_rules"
+        if mode is None:
+            rows = self.query(sql + " ORDER BY mode, number")
+        else:
+            rows = self.query(sql + " WHERE mode = ? ORDER BY number", (mode,))
+        return [self._rate_rule(row) for row in rows]
+
+    def get_rate_rule(self, mode, number):
+        rows = self.query("SELECT mode, number, rate, count, last_draw FROM rate_rules "
+                          "WHERE mode = ? AND number = ?", (mode, number))
+        return self._rate_rule(rows[0]) if rows else None
+
+    def save_rate_rules(self, rules):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rate_rules (mode, number, rate, count, last_draw) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(r["mode"], r["number"], r["rate"], r["count"], _to_text(r["last_draw"]))
+                 for r in rules])
+            self._touch(conn, "rate")
+
+    def clear_rate_rules(self, mode=None):
+        with self.transaction() as conn:
+            if mode is None:
+                conn.execute("DELETE FROM rate_rules")
+            else:
+                conn.execute("DELETE FROM rate_rules WHERE mode = ?", (mode,))
+            self._touch(conn, "rate")
+
+    def load_chain_rules(self, mode=None):
+        sql = "SELECT mode, trigger_number, target, last_draw FROM chain_rules"
+        if mode is None:
+            rows = self.query(sql + " ORDER BY mode, trigger_number")
+        else:
+            rows = self.query(sql + " WHERE mode = ? ORDER BY trigger_number", (mode,))
+        return [self._chain_rule(row) for row in rows]
+
+    def get_chain_rule(self, mode, trigger):
+        rows = self.query("SELECT mode, trigger_number, target, last_draw FROM chain_rules "
+                          "WHERE mode = ? AND trigger_number = ?", (mode, trigger))
+        return self._chain_rule(rows[0]) if rows else None
+
+    def save_chain_rules(self, rules):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chain_rules (mode, trigger_number, target, last_draw) "
+                "VALUES (?, ?, ?, ?)",
+                [(r["mode"], r["trigger"], r["target"], _to_text(r["last_draw"])) for r in rules])
+            self._touch(conn, "chain")
+
+    def clear_chain_rules(self, mode=None):
+        with self.transaction() as conn:
+            if mode is None:
+                conn.execute("DELETE FROM chain_rules")
+            else:
+                conn.execute("DELETE FROM chain_rules WHERE mode = ?", (mode,))
+            self._touch(conn, "chain")
+
+    # 抽号事件历史
+    def append_draw_event(self, event):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO draw_events (time, mode, gender, max_num, numbers, seed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (event["time"], event["mode"], event["gender"], event["max_num"],
+                 " ".join(str(n) for n in event["numbers"]), event.get("seed")))
+
+    def load_draw_events(self):
+        rows = self.query("SELECT time, mode, gender, max_num, numbers, seed FROM draw_events "
+                          "ORDER BY time, id")
+        return [{"time": t, "mode": mode, "numbers": [int(n) for n in numbers.split()],
+                 "gender": gender, "max_num": max_num, "seed": seed}
+                for t, mode, gender, max_num, numbers, seed in rows]
+
+    # 禁止时间段
+    def load_time_ranges(self):
+        with self.lock:
+            saved = self.query("SELECT value FROM settings WHERE name = 'time_ranges_saved'")
+            if not saved:
+                return None
+            rows = self.query("SELECT start_hour, start_minute, end_hour, end_minute "
+                              "FROM time_ranges ORDER BY position")
+        return [tuple(row) for row in rows]
+
+    def save_time_ranges(self, ranges):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM time_ranges")
+            conn.executemany("INSERT INTO time_ranges VALUES (?, ?, ?, ?, ?)",
+                             [(i,) + tuple(r) for i, r in enumerate(ranges)])
+            conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('time_ranges_saved', '1')")
+            self._touch(conn, "time")
+
+    # 变化检测: 每次修改规则或时间段时递增该数据源的计数, 其他连接的修改同样可见
+    @staticmethod
+    def _touch(conn, source):
+        conn.execute("INSERT INTO change_stamps (source, stamp) VALUES (?, 1) "
+                     "ON CONFLICT (source) DO UPDATE SET stamp = stamp + 1", (source,))
+
+    def change_stamp(self, source):
+        rows = self.query("SELECT stamp FROM change_stamps WHERE source = ?", (source,))
+        return rows[0][0] if rows else 0
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def migrate_storage(source, target):
+    """把source中的记录、规则、抽号历史和时间段整体复制到target(如从文件布局切换到SQLite)"""
+    with target.transaction() if isinstance(target, SqliteStorage) else nullcontext():
+        for mode in source.record_modes():
+            target.rewrite_records(mode, source.read_records(mode))
+        target.save_rate_rules(source.load_rate_rules())
+        target.save_chain_rules(source.load_chain_rules())
+        for event in source.load_draw_events():
+            target.append_draw_event(event)
+        ranges = source.load_time_ranges()
+        if ranges is not None:
+            target.save_time_ranges(ranges)
+
+
+def create_storage(backend=STORAGE_FILE, config_folder="ConfigEngine", durability=DEFAULT_DURABILITY):
+    """按名称创建存储后端; 首次使用SQLite时自动导入原有文件布局中的数据"""
+    if backend == STORAGE_FILE:
+        return FileStorage(config_folder, durability)
+    if backend == STORAGE_SQLITE:
+        os.makedirs(config_folder, exist_ok=True)
+        path = os.path.join(config_folder, DATABASE_NAME)
+        is_new = not os.path.exists(path)
+        storage = SqliteStorage(path, durability)
+        if is_new:
+            try:
+                source = FileStorage(config_folder)
+                migrate_storage(source, storage)
+                source.close()
+            except Exception as e:
+                log.error({
+                    "error": "导入文件数据到数据库失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
+                })
+        return storage
+    raise ValueError(f"未知的存储后端: {backend}")
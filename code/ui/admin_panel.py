@@ -42,6 +42,13 @@ class AdminPanel:
         self.number_entry = ttk.Entry(rate_setting_frame, width=15)
         self.number_entry.grid(row=1, column=1, sticky="w", padx=5, pady=5)
         
+        ttk.Label(rate_setting_frame, text="姓名查找:").grid(row=1, column=2, sticky="e", padx=5, pady=5)
+        self.search_var = tk.StringVar()
+        self.search_box = ttk.Combobox(rate_setting_frame, textvariable=self.search_var, width=18)
+        self.search_box.grid(row=1, column=3, sticky="w", padx=5, pady=5)
+        self.search_box.bind("<KeyRelease>", self.search_student)
+        self.search_box.bind("<<ComboboxSelected>>", self.select_student)
+        
         ttk.Label(rate_setting_frame, text="爆率(抽中频率):").grid(row=2, column=0, sticky="e", padx=5, pady=5)
         self.rate_entry = ttk.Entry(rate_setting_frame, width=15)
         self.rate_entry.grid(row=2, column=1, sticky="w", padx=5, pady=5)
@@ -99,6 +106,8 @@ class AdminPanel:
                   command=self.show_chain_settings).pack(fill=tk.X, pady=5, padx=20)
         ttk.Button(record_setting_frame, text="重置所有记录", 
                   command=self.reset_all_records).pack(fill=tk.X, pady=5, padx=20)
+        ttk.Button(record_setting_frame, text="压缩记录文件", 
+                  command=self.compact_records).pack(fill=tk.X, pady=5, padx=20)
         ttk.Button(record_setting_frame, text="清除所有爆率", 
                   command=self.clear_all_rates).pack(fill=tk.X, pady=5, padx=20)
         ttk.Button(record_setting_frame, text="清除所有连锁", 
@@ -132,6 +141,16 @@ class AdminPanel:
                 messagebox.showerror("错误", "未找到有效的权限文件", parent=self.top)
         return False
 
+    def search_student(self, event=None):
+        """输入姓名时实时查找, 结果显示在下拉列表中"""
+        results = self.app.record_manager.search_students(self.search_var.get())
+        self.search_box["values"] = [f"{number} {name} {gender}" for number, name, gender in results]
+
+    def select_student(self, event=None):
+        number = self.search_var.get().split()[0]
+        self.number_entry.delete(0, tk.END)
+        self.number_entry.insert(0, number)
+
     def set_rate(self):
         try:
             mode = self.mode_var.get()
@@ -298,6 +317,14 @@ class AdminPanel:
             else:
                 messagebox.showerror("错误", "重置记录失败", parent=self.top)
 
+    def compact_records(self):
+        if messagebox.askyesno("确认", "确定要压缩所有模式的抽号记录吗？\n(去掉重复记录，已抽号码不变)", parent=self.top):
+            removed = self.app.record_manager.compact()
+            if removed is None:
+                messagebox.showerror("错误", "压缩记录失败", parent=self.top)
+            else:
+                messagebox.showinfo("成功", f"记录已压缩，共删除{removed}条重复记录", parent=self.top)
+
     def update_time_display(self):
         self.time_text.delete(1.0, tk.END)
         ranges = self.app.time_restriction.get_time_ranges()
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
+import threading
 import time
 import win32api
 import win32file
@@ -45,7 +46,7 @@ class ImportDataPanel(tk.Toplevel):
         drop_frame = ttk.LabelFrame(main_frame, text="拖放文件区域", padding=10)
         drop_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
-        self.drop_label = tk.Label(drop_frame, text="将TXT文件拖放到此区域\n\n(文件内容应为每行一个数字)", 
+        self.drop_label = tk.Label(drop_frame, text="将TXT文件拖放到此区域(可多选)\n\n(文件内容应为每行一个数字, 文件名含模式名时导入到对应模式)", 
                                  relief="groove", bg="white", height=8, 
                                  font=("微软雅黑", 12), padx=20, pady=20)
         self.drop_label.pack(fill=tk.BOTH, expand=True)
@@ -63,7 +64,12 @@ class ImportDataPanel(tk.Toplevel):
         btn_frame.pack(pady=10)
         self.process_btn = ttk.Button(btn_frame, text="处理文件", command=self.process_file, state="disabled")
         self.process_btn.pack(side=tk.LEFT, padx=5)
-        self.current_file = None
+        self.current_files = []
+        self.import_thread = None
+        self.import_progress = None
+        self.import_parsed = None  # 后台线程的解析结果(report, parsed)
+        self.import_error = None   # 后台线程中的异常信息
+        self.import_files = None
         ttk.Button(btn_frame, text="关闭", command=self.on_close).pack(side=tk.RIGHT, padx=5)
         
         self.status_var = tk.StringVar()
@@ -81,47 +87,121 @@ class ImportDataPanel(tk.Toplevel):
         self.status_var.set("等待文件拖入...")
     
     def select_file(self):
-        """手动选择文件"""
-        filepath = filedialog.askopenfilename(
+        """手动选择文件, 可一次选择多个"""
+        filepaths = filedialog.askopenfilenames(
             title="选择TXT文件",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
         )
-        if not filepath:
+        if not filepaths:
             return
-            
-        self.current_file = filepath.replace('\\', '/')
-        # 不直接启用处理按钮，等待检测到U盘
-        self.status_var.set(f"已选择文件: {os.path.basename(filepath)}")
-        self.status_var.set(f"已选择文件: {os.path.basename(filepath)}")
-        
-        if not filepath.lower().endswith(".txt"):
-            self.status_var.set("错误: 只支持TXT文件")
-            messagebox.showerror("错误", "只支持TXT格式的文件")
-            return
-        
+
         if not self.mode_var.get():
             self.status_var.set("错误: 请先选择模式")
             messagebox.showerror("错误", "请先选择导入模式")
             return
-        
+
+        if not self.set_files([p.replace('\\', '/') for p in filepaths]):
+            return
+        self.start_import()
+
+    def set_files(self, filepaths):
+        """记录待导入的文件, 非TXT文件被忽略"""
+        files = [p for p in filepaths if p.lower().endswith('.txt')]
+        if not files:
+            self.status_var.set("错误: 只支持TXT文件")
+            messagebox.showerror("错误", "只支持TXT格式的文件")
+            return False
+        self.current_files = files
+        return True
+
+    def get_import_files(self):
+        """按文件名对应模式, 文件名中没有模式时使用选中的模式"""
+        default = self.mode_var.get()
+        return [(path, self.app.record_manager.mode_for_file(path, default))
+                for path in self.current_files]
+
+    def start_import(self):
+        """在后台线程中导入, 界面通过定时轮询显示进度"""
+        if self.import_thread is not None:
+            return
+        files = self.get_import_files()
+        self.import_files = files
+        self.import_progress = None
+        self.import_parsed = None
+        self.import_error = None
+        self.status_var.set(f"正在导入{len(files)}个文件...")
+        self.process_btn.config(state="disabled")
+        self.confirm_btn.config(state="disabled")
+        self.import_thread = threading.Thread(target=self.run_import, args=(files,), daemon=True)
+        self.import_thread.start()
+        self.after(100, self.poll_import)
+
+    def run_import(self, files):
+        """后台线程只解析文件; 写入记录和更新缓存在poll_import中由界面线程完成"""
         try:
-            self.status_var.set("正在导入数据...")
-            self.update()
-            
-            success = self.app.record_manager.import_history(self.mode_var.get(), filepath)
-            
-            if success:
-                self.status_var.set("导入成功!")
-                messagebox.showinfo("成功", f"数据已成功导入到【{self.mode_var.get()}】模式")
-                self.on_close()
-            else:
-                self.status_var.set("导入失败")
-                messagebox.showerror("错误", "数据导入失败，请检查文件格式")
-                
+            self.import_parsed = self.app.record_manager.parse_import_files(files, self.on_import_progress)
         except Exception as e:
-            self.status_var.set(f"错误: {str(e)}")
-            messagebox.showerror("错误", f"导入过程中发生错误: {str(e)}")
-    
+            self.import_error = str(e)
+
+    def on_import_progress(self, report):
+        """导入过程中记录进度(在工作线程中调用, 不直接操作界面)"""
+        self.import_progress = (report["parsed"], report["total"])
+
+    def poll_import(self):
+        if self.import_thread.is_alive():
+            if self.import_progress:
+                parsed, total = self.import_progress
+                self.status_var.set(f"正在导入... 已解析{parsed}/{total}个文件")
+            self.after(100, self.poll_import)
+            return
+        self.import_thread = None
+        error = self.import_error
+        result = None
+        if error is None and self.import_parsed is None:
+            error = "导入未完成"
+        if error is None:
+            report, parsed = self.import_parsed
+            try:
+                result = self.app.record_manager.merge_import(self.import_files, parsed, report)
+            except Exception as e:
+                error = str(e)
+        if error is not None:
+            self.status_var.set(f"错误: {error}")
+            messagebox.showerror("错误", f"导入过程中发生错误: {error}")
+            self.confirm_btn.config(state="normal")
+            return
+        if self.import_succeeded(result):
+            self.status_var.set("导入成功!")
+            messagebox.showinfo("成功", self.format_import_report(result))
+            self.on_close()
+        else:
+            self.status_var.set("导入失败")
+            messagebox.showerror("错误", "数据导入失败，请检查文件格式\n" + self.format_import_report(result))
+            self.confirm_btn.config(state="normal")
+
+    @staticmethod
+    def import_succeeded(report):
+        if any(result["error"] for result in report["modes"].values()):
+            return False
+        return any(entry["read"] > entry["invalid"] for entry in report["files"])
+
+    @staticmethod
+    def format_import_report(report):
+        lines = []
+        for entry in report["files"]:
+            name = os.path.basename(entry["filepath"])
+            if entry["error"]:
+                lines.append(f"{name} → 【{entry['mode']}】 解析失败: {entry['error']}")
+            else:
+                lines.append(f"{name} → 【{entry['mode']}】 读取{entry['read']}行, 无效{entry['invalid']}行")
+        for mode, result in report["modes"].items():
+            if result["error"]:
+                lines.append(f"【{mode}】写入失败: {result['error']}")
+            else:
+                lines.append(f"【{mode}】重复{result['duplicate']}个, 写入{result['written']}个")
+        lines.append(f"共写入{report['written']}个号码")
+        return "\n".join(lines)
+
     def check_usb_drives(self):
         """显示U盘检测状态"""
         self.status_var.set("请点击确认按钮导入文件")
@@ -131,22 +211,22 @@ class ImportDataPanel(tk.Toplevel):
     # 使用管理员U盘进行数据导入，自动检测直到找到key文件
     
     def on_drop(self, event):
-        """处理拖放的文件"""
-        filepath = event.data.strip().replace('{', '').replace('}', '')
-        if not filepath.lower().endswith('.txt'):
-            messagebox.showerror("错误", "只支持TXT格式的文件")
+        """处理拖放的文件, 支持一次拖入多个"""
+        if not self.set_files(self.tk.splitlist(event.data)):
             return
-            
-        self.current_file = filepath
-        filename = os.path.basename(filepath)
-        self.drop_label.config(text=f"已拖入文件:\n{filename}\n\n(点击确认按钮处理)")
-        self.status_var.set(f"已拖入文件: {filename}")
+
+        files = self.get_import_files()
+        names = "\n".join(f"{os.path.basename(path)} → {mode}" for path, mode in files[:5])
+        if len(files) > 5:
+            names += f"\n... 共{len(files)}个文件"
+        self.drop_label.config(text=f"已拖入文件:\n{names}\n\n(点击确认按钮处理)")
+        self.status_var.set(f"已拖入{len(files)}个文件")
         if hasattr(self, 'confirm_btn'):
             self.confirm_btn.config(state="normal")
 
     def process_file(self):
         """处理已拖入的文件"""
-        if not self.current_file:
+        if not self.current_files:
             messagebox.showerror("错误", "没有可处理的文件")
             return
             
@@ -154,27 +234,11 @@ class ImportDataPanel(tk.Toplevel):
             messagebox.showerror("错误", "请先选择导入模式")
             return
             
-        try:
-            self.status_var.set("正在处理文件...")
-            self.update()
-            
-            success = self.app.record_manager.import_history(self.mode_var.get(), self.current_file)
-            
-            if success:
-                self.status_var.set("处理成功!")
-                messagebox.showinfo("成功", f"数据已成功导入到【{self.mode_var.get()}】模式")
-                self.on_close()
-            else:
-                self.status_var.set("处理失败")
-                messagebox.showerror("错误", "数据处理失败")
-                
-        except Exception as e:
-            self.status_var.set(f"错误: {str(e)}")
-            messagebox.showerror("错误", f"处理过程中发生错误: {str(e)}")
+        self.start_import()
 
     def confirm_import(self):
         """确认导入文件"""
-        if not self.current_file:
+        if not self.current_files:
             messagebox.showerror("错误", "没有可处理的文件")
             return
             
@@ -189,25 +253,8 @@ class ImportDataPanel(tk.Toplevel):
         for drive in removable_drives:
             admin_key_path = os.path.join(drive, "permission\\Administrator.txt")
             if os.path.exists(admin_key_path):
-                try:
-                    self.status_var.set("正在处理文件...")
-                    self.update()
-                    
-                    success = self.app.record_manager.import_history(self.mode_var.get(), self.current_file)
-                    
-                    if success:
-                        self.status_var.set("导入成功!")
-                        messagebox.showinfo("成功", f"数据已成功导入到【{self.mode_var.get()}】模式")
-                        self.on_close()
-                    else:
-                        self.status_var.set("导入失败")
-                        messagebox.showerror("错误", "数据导入失败，请检查文件格式")
-                    return
-                    
-                except Exception as e:
-                    self.status_var.set(f"错误: {str(e)}")
-                    messagebox.showerror("错误", f"导入过程中发生错误: {str(e)}")
-                    return
+                self.start_import()
+                return
         
         messagebox.showerror("错误", "未检测到管理员U盘，请插入管理员U盘后重试")
         return  # 保持当前界面
@@ -1,8 +1,8 @@
 import tkinter as tk
-from tkinter import font, ttk, simpledialog, messagebox, filedialog
+from tkinter import font, ttk, messagebox
 import random
-import os
-import pickle
+import time
+import traceback
 from datetime import datetime
 import win32api
 import win32file
@@ -10,26 +10,41 @@ from core.password_manager import USBDriveManager
 from core.record_manager import RecordManager
 from core.rate_manager import RateManager
 from config.time_manager import TimeRestriction
+from core.storage import create_storage, STORAGE_FILE
+from core.change_watcher import ChangeWatcher
+from core.log import logger, DEBUG
+from core.fair_sampler import STRATEGY_RANDOM, STRATEGY_FAIR
+from core import draw_replay
 from ui.admin_panel import AdminPanel
 from ui.import_panel import ImportDataPanel
 
+# 最大号码上限; 号码池按需惰性洗牌, 百万级号码也无需生成完整列表
+MAX_NUMBER = 1000000
+# 存储后端: "file"为原有文件布局, "sqlite"为ConfigEngine/lottery.db(首次使用时自动导入文件数据)
+STORAGE_BACKEND = STORAGE_FILE
+# 检查名单、记录、规则和时间段文件是否被修改的间隔(毫秒)
+CHANGE_CHECK_INTERVAL = 2000
+
+log = logger.get("app")
+draw_log = logger.get("draw")
+
 class LotteryApp:
     def __init__(self, root):
-        from core.log import LogManager
-        self.logger = LogManager(debug_mode=True)
-        
         self.root = root
         self.root.title("智能抽号系统")
-        self.logger.log("Initializing lottery application")
+        log.info("Initializing lottery application")
         
         default_font = font.nametofont("TkDefaultFont")
         default_font.configure(size=12)
         self.root.option_add("*Font", default_font)
         
         self.password_manager = USBDriveManager()
-        self.record_manager = RecordManager()
-        self.rate_manager = RateManager()
-        self.time_restriction = TimeRestriction()
+        self.storage = create_storage(STORAGE_BACKEND)
+        self.record_manager = RecordManager(storage=self.storage)
+        self.rate_manager = RateManager(self.storage)
+        self.time_restriction = TimeRestriction(self.storage)
+        self.replay_log = draw_replay.ReplayLog()
+        self.change_watcher = self.create_change_watcher()
         
         self.modes = self.record_manager.modes
         self.genders = self.record_manager.genders
@@ -44,6 +59,7 @@ class LotteryApp:
         self.current_number_index = 0
         self.selected_mode = None
         self.selected_gender = None
+        self.selected_strategy = STRATEGY_RANDOM
         self.admin_mode = False
         self.chain_triggered = False
         
@@ -67,6 +83,42 @@ class LotteryApp:
             self.check_usb_drive()  # 开始自动检测
         
         self.root.after(1000, self.periodic_check)
+        self.root.after(CHANGE_CHECK_INTERVAL, self.check_changes)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def create_change_watcher(self):
+        """登记各数据源: 文件被其他程序修改时只重载对应的缓存"""
+        watcher = ChangeWatcher()
+        watcher.watch("students", self.record_manager.student_stamp,
+                      self.record_manager.reload_student_info)
+        watcher.watch("records", self.record_manager.records_stamp, self.record_manager.refresh)
+        watcher.watch("rate", lambda: self.storage.change_stamp("rate"),
+                      lambda: self.rate_manager.reload_changed("rate"))
+        watcher.watch("chain", lambda: self.storage.change_stamp("chain"),
+                      lambda: self.rate_manager.reload_changed("chain"))
+        watcher.watch("time", lambda: self.storage.change_stamp("time"),
+                      self.time_restriction.reload_changed)
+        return watcher
+
+    def check_changes(self):
+        changed = self.change_watcher.check()
+        if changed:
+            log.info({"reloaded": changed, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        self.root.after(CHANGE_CHECK_INTERVAL, self.check_changes)
+
+    def on_close(self):
+        """关闭窗口前写出缓冲的抽号记录并释放文件"""
+        try:
+            self.record_manager.close()
+            self.rate_manager.close()
+            self.storage.close()
+        except Exception as e:
+            log.error({
+                "error": "关闭时写出数据失败",
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
+        self.root.destroy()
 
     def create_unlock_interface(self):
         self.unlock_frame = ttk.Frame(self.root, padding=20)
@@ -105,6 +157,14 @@ class LotteryApp:
             self.mode_dots[mode] = dot
             ttk.Label(self.mode_frame, text=mode, font=("微软雅黑", 12)).pack(side=tk.LEFT)
         
+        # 抽号策略: 选中"公平"时按距上次被抽中的时间加权, 久未被抽到的号码更容易抽中
+        ttk.Separator(self.mode_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=8)
+        self.strategy_dot = tk.Label(self.mode_frame, text="○", font=("Arial", 16),
+                                     cursor="hand2")
+        self.strategy_dot.pack(side=tk.LEFT, padx=8)
+        self.strategy_dot.bind("<Button-1>", lambda e: self.toggle_strategy())
+        ttk.Label(self.mode_frame, text="公平", font=("微软雅黑", 12)).pack(side=tk.LEFT)
+        
         self.mode_frame.pack(side=tk.TOP, pady=5)
 
         control_frame = ttk.Frame(self.normal_frame)
@@ -310,7 +370,11 @@ class LotteryApp:
                     return
                     
         except Exception as e:
-            self.logger.log(f"Periodic check error: {str(e)}")
+            log.error({
+                "error": "定时检查失败",
+                "exception": str(e),
+                "traceback": traceback.format_exc()
+            })
         finally:
             self.root.after(1000, self.periodic_check)
 
@@ -325,12 +389,12 @@ class LotteryApp:
             self.password_manager.reset_auth()
             self.password_manager.force_user_auth(True)  # 使用正式方法强制设置用户权限
             self.normal_frame.pack(expand=True, fill=tk.BOTH)
-            self.logger.log("Admin returning to normal interface")
+            log.info("Admin returning to normal interface")
         else:
             # 正常返回unlock界面
             self._from_admin = False  # 清除标记
             self.unlock_frame.pack(pady=50)
-            self.logger.log("Returning to unlock interface")
+            log.info("Returning to unlock interface")
         
         # 强制重置界面状态
         self.selected_mode = None
@@ -376,6 +440,17 @@ class LotteryApp:
             self.selected_mode = mode
         self.update_button_state()
 
+    def toggle_strategy(self):
+        if not self.check_time_restriction():
+            return
+            
+        if self.selected_strategy == STRATEGY_FAIR:
+            self.selected_strategy = STRATEGY_RANDOM
+            self.strategy_dot.config(text="○")
+        else:
+            self.selected_strategy = STRATEGY_FAIR
+            self.strategy_dot.config(text="●")
+
     def toggle_gender(self, gender):
         if not self.check_time_restriction():
             return
@@ -392,7 +467,7 @@ class LotteryApp:
 
     def update_button_state(self):
         try:
-            valid_max = self.max_num_entry.get().isdigit() and 1 <= int(self.max_num_entry.get()) <= 100
+            valid_max = self.max_num_entry.get().isdigit() and 1 <= int(self.max_num_entry.get()) <= MAX_NUMBER
             valid_quantity = self.quantity_entry.get().isdigit() and 1 <= int(self.quantity_entry.get()) <= 5
             ready = all([
                 valid_max,
@@ -406,6 +481,51 @@ class LotteryApp:
         except:
             self.btn.state(['disabled'])
 
+    def log_draw(self):
+        """记录本次抽出的号码和对应的学生信息"""
+        # 模式名称映射
+        mode_mapping = {
+            "模式一": "Mode1",
+            "模式二": "Mode2", 
+            "模式三": "Mode3",
+            "模式四": "Mode4",
+            "模式五": "Mode5"
+        }
+        mode_en = mode_mapping.get(self.selected_mode, self.selected_mode)
+        
+        # 生成JSON格式日志
+        log_data = {
+            "mode": mode_en,
+            "drawn_numbers": self.numbers_to_show,
+            "rate_info": self.last_draw_explanation["rate_info"],
+            "chain_info": {
+                "trigger_status": "not triggered",
+                "trigger_condition": None,
+                "target_number": None
+            },
+            "gender_restriction": self.selected_gender or "none",
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        draw_log.debug(log_data)
+        
+        # 记录学生信息 (JSON格式)
+        student_logs = []
+        for num in self.numbers_to_show:
+            name, gender = self.record_manager.get_student_info(num)
+            if name:
+                gender_en = "Male" if gender == "♂" else "Female" if gender == "♀" else "Unknown"
+                student_logs.append({
+                    "number": num,
+                    "name": name,
+                    "gender": gender_en
+                })
+        
+        if student_logs:
+            draw_log.debug({
+                "students": student_logs,
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
     def start_lottery(self):
         if not self.check_time_restriction():
             return
@@ -416,127 +536,61 @@ class LotteryApp:
         try:
             max_num = int(self.max_num_entry.get())
             quantity = int(self.quantity_entry.get())
-            if not (1 <= max_num <= 100) or not (1 <= quantity <=5):
+            if not (1 <= max_num <= MAX_NUMBER) or not (1 <= quantity <=5):
                 return
         except:
             return
         
-        # 初始化可用号码(不检查是否重复)
-        available = set(range(1, max_num+1))
+        # 可用号码取自本模式的洗牌号码池, 保证一轮内不重不漏;
+        # 号码池本身就是可用号码集合, 选中的号码立即从池中移除, 不再复制候选列表
         gender_numbers = None
         if self.selected_gender:
             gender_numbers = self.record_manager.gender_numbers_cache[self.selected_gender]
-            available = available & gender_numbers
-        
-        self.numbers_to_show = []
-        remaining = quantity
-        temp_available = list(available)
-
-        i = 0
-        while i < remaining and temp_available:
-            # 优先检查连锁规则
-            if self.numbers_to_show:
-                last_num = self.numbers_to_show[-1]
-                chain_dict = self.rate_manager.check_chain(
-                    self.selected_mode,
-                    [last_num],
-                    temp_available,
-                    gender_numbers
-                )
-                # 强制应用连锁规则(如果目标号码符合性别要求)
-                if last_num in chain_dict:
-                    target_num = chain_dict[last_num]["目标号码"]
-                    if gender_numbers is None or target_num in gender_numbers:
-                        self.numbers_to_show.append(target_num)
-                        temp_available.remove(target_num)
-                        i += 1
-                        continue
-
-            # 其次检查爆率设置
-            adjusted = self.rate_manager.check_rate(
-                self.selected_mode, 
-                temp_available,
-                gender_numbers
-            )
-            if adjusted:
-                selected = random.choice(adjusted)
-                self.numbers_to_show.append(selected)
-                temp_available.remove(selected)
-                i += 1
-                continue
-
-            # 最后随机选择
-            if gender_numbers:
-                available = [n for n in temp_available if n in gender_numbers]
-            else:
-                available = temp_available.copy()
-                
-            if available:
-                selected = random.choice(available)
-                self.numbers_to_show.append(selected)
-                temp_available.remove(selected)
-                i += 1
+        deck = self.record_manager.get_deck(self.selected_mode, self.selected_gender, max_num)
+        # 每次抽号使用独立的随机种子, 抽号前的状态和种子一起保存, 可用draw_replay重放
+        seed = draw_replay.new_seed()
+        when = time.time()
+        sampler = None
+        if self.selected_strategy == STRATEGY_FAIR:
+            sampler = self.record_manager.get_fair_sampler(self.selected_mode, self.selected_gender,
+                                                           deck, when)
+        snapshot = draw_replay.capture(self.rate_manager, self.selected_mode, self.selected_gender,
+                                       max_num, quantity, deck, gender_numbers, sampler,
+                                       self.selected_strategy, seed, when)
+
+        # 连锁、爆率和随机选择在一次调用中完成; 本轮抽完时重新洗牌继续
+        self.numbers_to_show, self.last_draw_explanation = self.rate_manager.draw_many(
+            self.selected_mode,
+            quantity,
+            deck,
+            gender_numbers,
+            refill=lambda: self.record_manager.get_deck(self.selected_mode, self.selected_gender, max_num),
+            rng=draw_replay.draw_rng(seed),
+            sampler=sampler,
+            now=when
+        )
 
         if self.numbers_to_show:
-            self.record_manager.add_record(self.selected_mode, self.numbers_to_show)
-            # 模式名称映射
-            mode_mapping = {
-                "模式一": "Mode1",
-                "模式二": "Mode2", 
-                "模式三": "Mode3",
-                "模式四": "Mode4",
-                "模式五": "Mode5"
-            }
-            mode_en = mode_mapping.get(self.selected_mode, self.selected_mode)
-            
-            # 生成JSON格式日志
-            log_data = {
-                "mode": mode_en,
-                "drawn_numbers": self.numbers_to_show,
-                "rate_info": [],
-                "chain_info": {
-                    "trigger_status": "not triggered",
-                    "trigger_condition": None,
-                    "target_number": None
-                },
-                "gender_restriction": self.selected_gender or "none",
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.logger.log(log_data)
-            
-            # 记录学生信息 (JSON格式)
-            student_logs = []
-            for num in self.numbers_to_show:
-                name, gender = self.record_manager.get_student_info(num)
-                if name:
-                    gender_en = "Male" if gender == "♂" else "Female" if gender == "♀" else "Unknown"
-                    student_logs.append({
-                        "number": num,
-                        "name": name,
-                        "gender": gender_en
-                    })
-            
-            if student_logs:
-                self.logger.log({
-                    "students": student_logs,
-                    "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            snapshot["numbers"] = list(self.numbers_to_show)
+            try:
+                self.replay_log.save(snapshot)
+            except Exception as e:
+                draw_log.error({
+                    "error": "保存抽号快照失败",
+                    "exception": str(e),
+                    "traceback": traceback.format_exc()
                 })
-            
+            self.record_manager.add_record(self.selected_mode, self.numbers_to_show,
+                                           self.selected_gender, max_num, seed=seed, when=when)
+            # 抽号日志只在draw子系统启用debug级别时生成
+            if draw_log.is_enabled(DEBUG):
+                self.log_draw()
+
             # 确保前后端一致，重新从rate_manager获取实际抽中号码
             final_numbers = []
             for num in self.numbers_to_show:
-                rate_files = [f for f in os.listdir(self.rate_manager.rate_folder) 
-                            if f.endswith(".rate")]
-                for filename in rate_files:
-                    try:
-                        with open(os.path.join(self.rate_manager.rate_folder, filename), "rb") as f:
-                            data = pickle.load(f)
-                            if data["number"] == num and data["mode"] == self.selected_mode:
-                                data["count"] = 0 if data["count"] >= data["rate"] else data["count"]
-                                final_numbers.append(num)
-                                break
-                    except:
-                        continue
+                if self.rate_manager.get_rate_rule(self.selected_mode, num) is not None:
+                    final_numbers.append(num)
             
             self.numbers_to_show = final_numbers if final_numbers else self.numbers_to_show
         
@@ -549,7 +603,7 @@ class LotteryApp:
 
     def run_single_animation(self, max_num):
         if not self.numbers_to_show:
-            self.logger.log("Error: No numbers to show in animation")
+            log.error({"error": "没有可显示的号码"})
             return
             
         self.blinking = True
@@ -627,15 +681,15 @@ class LotteryApp:
     def show_dev_info(self, event=None):
         # 管理员模式直接打开导入界面
         if self.admin_mode:
-            self.logger.log("Admin mode opening import panel")
+            log.info("Admin mode opening import panel")
             panel = ImportDataPanel(self.root, self)
             panel.transient(self.root)
             panel.grab_set()
         elif self.password_manager.is_user_unlocked():
-            self.logger.log("User mode opening import panel")
+            log.info("User mode opening import panel")
             panel = ImportDataPanel(self.root, self)
             panel.transient(self.root)
             panel.grab_set()
         else:
-            self.logger.log("Attempted to open import panel without verified USB")
+            log.info("Attempted to open import panel without verified USB")
             messagebox.showerror("错误", "请先验证用户U盘")